@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce.settings')
+# Serve the async catalog and cart views (STORE_ASYNC_VIEWS=0 keeps the sync ones)
+os.environ.setdefault('STORE_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
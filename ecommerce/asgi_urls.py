@@ -0,0 +1,12 @@
+"""
+URLs for the ASGI deployment: the async catalog and cart views from
+store/async_urls.py, then everything else exactly as under WSGI.
+"""
+
+from django.urls import include, path
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('', include('store.async_urls')),
+] + wsgi_urlpatterns
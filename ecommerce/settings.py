@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from store.sqlite import TUNED_PRAGMAS
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -23,9 +26,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-efshowhgk)sz6j77#u0idcr#g1tifvv(+680_k^#eo2ehp_d93'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -41,8 +44,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'store.middleware.ReplicaStickinessMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -50,7 +55,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'ecommerce.urls'
+# ecommerce/asgi.py turns on the async catalog and cart views
+STORE_ASYNC_VIEWS = os.environ.get('STORE_ASYNC_VIEWS', '0') == '1'
+ROOT_URLCONF = 'ecommerce.asgi_urls' if STORE_ASYNC_VIEWS else 'ecommerce.urls'
 
 TEMPLATES = [
     {
@@ -73,17 +80,81 @@ WSGI_APPLICATION = 'ecommerce.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Everything is configurable from the environment; with nothing set this is
+# the single local SQLite file. DB_REPLICAS is a comma-separated list of
+# replica hosts (PostgreSQL) or files (SQLite stand-ins).
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+
+# SQLite profile: 'tuned' (default) or 'plain' for SQLite's stock behaviour.
+# Tuned means WAL so readers never block the writer, synchronous=NORMAL (safe
+# with WAL, fsync only at checkpoints), a memory map and a bigger page cache,
+# and IMMEDIATE transactions so a writer takes the lock at BEGIN and waits
+# on busy_timeout instead of failing a lock upgrade with "database is locked".
+DB_SQLITE_PROFILE = os.environ.get('DB_SQLITE_PROFILE', 'tuned')
+STORE_SQLITE_PRAGMAS = {}
+
+if DB_ENGINE == 'django.db.backends.sqlite3':
+    PRIMARY_DATABASE = {
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
     }
-}
+    if DB_SQLITE_PROFILE == 'tuned':
+        PRIMARY_DATABASE['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+        STORE_SQLITE_PRAGMAS = dict(TUNED_PRAGMAS)
+else:
+    PRIMARY_DATABASE = {
+        'ENGINE': DB_ENGINE,
+        'NAME': os.environ.get('DB_NAME', 'shopkart'),
+        'USER': os.environ.get('DB_USER', ''),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', ''),
+        'PORT': os.environ.get('DB_PORT', ''),
+    }
+
+# Persistent connections, or a psycopg connection pool with DB_POOL_MAX_SIZE
+# (PostgreSQL only; Django manages pooled connections itself, so CONN_MAX_AGE is 0)
+# Under ASGI each request does its sync work on a fresh thread, so persistent
+# connections would pile up - there the default is to close them per request.
+PRIMARY_DATABASE['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', '0' if STORE_ASYNC_VIEWS else '60'))
+PRIMARY_DATABASE['CONN_HEALTH_CHECKS'] = True
+if DB_ENGINE == 'django.db.backends.postgresql' and os.environ.get('DB_POOL_MAX_SIZE'):
+    PRIMARY_DATABASE['CONN_MAX_AGE'] = 0
+    PRIMARY_DATABASE['OPTIONS'] = {'pool': {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE')),
+        'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+    }}
+
+DATABASES = {'default': PRIMARY_DATABASE}
+
+STORE_READ_REPLICAS = []
+for i, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica_{i}'
+    location = {'NAME': replica} if DB_ENGINE == 'django.db.backends.sqlite3' else {'HOST': replica}
+    # Tests see every replica as the test copy of the primary
+    DATABASES[alias] = {**PRIMARY_DATABASE, **location, 'TEST': {'MIRROR': 'default'}}
+    STORE_READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['store.routers.ReplicaRouter']
+
+# Queue writing views behind one in-process FIFO lock (SQLite only), so
+# concurrent cart writes wait their turn instead of racing for the file lock
+STORE_SQLITE_WRITE_QUEUE = os.environ.get('DB_SQLITE_WRITE_QUEUE', '0') == '1'
+
+# After a write, the client reads from the primary for this long (replica lag budget)
+STORE_REPLICA_STICKY_SECONDS = 5
 
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# Signed-in users are loaded with their profile in one query (store/auth.py).
+# ModelBackend only resolves sessions logged in under the default setting.
+AUTHENTICATION_BACKENDS = [
+    'store.auth.ProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,12 +187,24 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Production asset mode (DEBUG off): hashed names plus .gz/.br variants built by
+# collectstatic, served by store.assets with far-future Cache-Control
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': ('django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+                    else 'store.storage.CompressedManifestStaticFilesStorage'),
+    },
+}
+STORE_STATIC_MAX_AGE = 31536000  # one year, only for content-hashed names
+STORE_MEDIA_MAX_AGE = 86400
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-import os
 
 # Media files configuration
 MEDIA_URL = '/media/'
@@ -132,3 +215,116 @@ LOGOUT_REDIRECT_URL = '/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
+
+# Products per page on catalog listings (keyset pagination)
+STORE_PAGE_SIZE = 24
+
+# Product search backend - FTS5 index stored next to the database
+STORE_SEARCH = {
+    'BACKEND': 'store.search.FTS5SearchBackend',
+    'OPTIONS': {'path': BASE_DIR / 'search_index.sqlite3'},
+}
+# Most ranked results one filtered search (API ?q= with ?category=) reads per page
+STORE_SEARCH_MAX_SCAN = 2000
+
+# Typeahead suggestions - in-memory prefix index bounds
+STORE_SUGGEST_MAX_ENTRIES = 500000
+STORE_SUGGEST_MAX_AGE = 300  # seconds before other workers' changes are picked up
+
+# Caches - fragments default to LocMem, set STORE_FRAGMENT_CACHE to
+# "file:///var/tmp/shopkart" or "redis://host:6379/1" in production
+FRAGMENT_CACHE_URL = os.environ.get('STORE_FRAGMENT_CACHE', '')
+if FRAGMENT_CACHE_URL.startswith('redis://'):
+    FRAGMENT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': FRAGMENT_CACHE_URL,
+    }
+elif FRAGMENT_CACHE_URL.startswith('file://'):
+    FRAGMENT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': FRAGMENT_CACHE_URL[len('file://'):],
+    }
+else:
+    FRAGMENT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'store-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'fragments': FRAGMENT_CACHE,
+    # Same backend as the fragments; a LocMem cache gets its own store
+    'sessions': {**FRAGMENT_CACHE, 'LOCATION': 'store-sessions'} if not FRAGMENT_CACHE_URL else FRAGMENT_CACHE,
+}
+STORE_FRAGMENT_CACHE_ALIAS = 'fragments'
+# Lifetime of fragments and their version stamps. A LocMem cache is per process:
+# with several workers (WEB_CONCURRENCY > 1, see check store.W002) an edit only
+# reaches the worker that made it and the others serve their copy until it
+# expires, so keep that short unless STORE_FRAGMENT_CACHE is shared.
+STORE_FRAGMENT_TIMEOUT = 86400 if FRAGMENT_CACHE_URL else 60
+
+# Sessions - STORE_SESSIONS=cached_db reads sessions from the cache and only
+# touches django_session on a miss or a change; signed_cookies keeps them in the
+# browser with no storage at all (logout can't revoke a copied cookie); db is
+# Django's default. cached_db is only safe on a cache every worker shares (a
+# per-process LocMem copy outlives logouts on the other workers), so it is the
+# default only when STORE_FRAGMENT_CACHE is set; see also the store.W001 check.
+STORE_SESSIONS = os.environ.get('STORE_SESSIONS', 'cached_db' if FRAGMENT_CACHE_URL else 'db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{STORE_SESSIONS}'
+SESSION_CACHE_ALIAS = 'sessions'
+# Only requests that change the session write it
+SESSION_SAVE_EVERY_REQUEST = False
+
+# Guest carts live in the session, capped so the payload stays small
+STORE_GUEST_CART_MAX_LINES = 50
+# Legacy guest Cart rows untouched this long are deleted by reap_guest_data
+STORE_GUEST_CART_TTL_DAYS = 30
+
+# Orders per page on the order history page
+STORE_ORDERS_PER_PAGE = 10
+
+# Order emails. Written to the console locally (EMAIL_BACKEND=...filebased.EmailBackend
+# writes them to EMAIL_FILE_PATH instead); point at SMTP in production.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+DEFAULT_FROM_EMAIL = 'ShopKart <orders@shopkart.local>'
+# Base of the links in emails
+STORE_SITE_URL = os.environ.get('STORE_SITE_URL', 'http://localhost:8000')
+# Notification outbox worker (manage.py send_notifications): attempts before a
+# message is marked failed, backoff (seconds, doubling up to the max) and how
+# long a claimed batch is reserved for its worker
+STORE_NOTIFICATION_MAX_ATTEMPTS = 8
+STORE_NOTIFICATION_RETRY_BASE = 30
+STORE_NOTIFICATION_RETRY_MAX = 3600
+STORE_NOTIFICATION_LEASE = 300
+
+# JSON API (/api/v1/) - largest ?limit= and most products per batch call
+STORE_API_MAX_PAGE_SIZE = 100
+STORE_API_MAX_BATCH = 100
+
+# Responsive image renditions (widths in px) and the worker threads that build them
+STORE_IMAGE_WIDTHS = [160, 320, 640]
+STORE_IMAGE_WORKERS = 2
+# An image whose renditions failed is not retried for this long (seconds)
+STORE_IMAGE_RETRY_SECONDS = 600
+# Profile picture uploads - largest accepted file, and the edge (px) they are resized to
+STORE_PROFILE_PICTURE_MAX_BYTES = 10 * 1024 * 1024
+STORE_PROFILE_PICTURE_SIZE = 512
+# Uploads wait here, outside MEDIA_ROOT, until the workers have processed them
+STORE_UPLOAD_STAGING_ROOT = os.path.join(BASE_DIR, 'private', 'pending_uploads')
+
+# Shared-cache lifetime for anonymous catalog pages (revalidated with ETags after that)
+STORE_CATALOG_MAX_AGE = 60
+
+# Per-request instrumentation, off unless STORE_INSTRUMENTATION=1: Server-Timing
+# headers, Prometheus text at /metrics and a sampled log of slow requests.
+# Totals are per process, so scrape every worker.
+STORE_INSTRUMENTATION = os.environ.get('STORE_INSTRUMENTATION', '0') == '1'
+STORE_SERVER_TIMING = True
+STORE_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+STORE_SLOW_REQUEST_MS = 500
+STORE_SLOW_REQUEST_SAMPLE_RATE = 0.1
+
+# Lets the suite run with DB_REPLICAS set (replicas share the test connection)
+TEST_RUNNER = 'store.testing.ReplicaAwareTestRunner'
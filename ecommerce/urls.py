@@ -1,16 +1,30 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
+from store.assets import serve_media, serve_static
+from store.instrumentation import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('store.urls')),
     # Authentication URLs - Django built-in
     path('accounts/', include('django.contrib.auth.urls')),
+    # JSON API
+    path('api/v1/', include('store.api_urls')),
+    # Prometheus scrape endpoint (STORE_INSTRUMENTATION)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Media files during development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+else:
+    # Production asset mode - cache headers, ETags, Range and precompressed static files
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), serve_static),
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
+    ]
\ No newline at end of file
@@ -1,17 +1,79 @@
-from django.contrib import admin
-from .models import Category, Product, Order, OrderItem, Cart, CartItem, UserProfile, Address
+import io
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from .catalog_io import CatalogImporter, export_rows, format_rows, guess_format, read_rows
+from .models import (Address, Cart, CartItem, Category, DailyCategorySales, DailyProductSales, DailySales,
+                     Notification, Order, OrderItem, Product, UserProfile)
 
 # Category Admin
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'description']
     search_fields = ['name']
 
+# Product import upload (ProductAdmin.import_view)
+class ProductImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV or JSON Lines, as written by the export actions')
+    download_images = forms.BooleanField(required=False, initial=True)
+
+
 # Product Admin  
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'price', 'category', 'stock', 'created_at']
+    list_display = ['name', 'sku', 'price', 'category', 'stock', 'created_at']
     list_filter = ['category', 'created_at']
-    search_fields = ['name', 'description']
+    search_fields = ['name', 'description', 'sku']
     list_editable = ['price', 'stock']
+    actions = ['export_csv', 'export_jsonl']
+
+    def export(self, queryset, fmt):
+        response = StreamingHttpResponse(format_rows(export_rows(queryset), fmt),
+                                         content_type='text/csv' if fmt == 'csv' else 'application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+        return response
+
+    @admin.action(description='Export selected products as CSV')
+    def export_csv(self, request, queryset):
+        return self.export(queryset, 'csv')
+
+    @admin.action(description='Export selected products as JSON Lines')
+    def export_jsonl(self, request, queryset):
+        return self.export(queryset, 'jsonl')
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='store_product_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Upload form for CatalogImporter; use import_products for very large files"""
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            return redirect('admin:store_product_changelist')
+        form = ProductImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            importer = CatalogImporter(images=form.cleaned_data['download_images'])
+            stats = importer.run(read_rows(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''),
+                                           guess_format(upload.name)))
+            self.message_user(request, f"Imported {stats['rows']} rows: {stats['created']} created, "
+                                       f"{stats['updated']} updated, {stats['skipped']} skipped.")
+            for error in importer.errors:
+                self.message_user(request, error, level=messages.WARNING)
+            return redirect('admin:store_product_changelist')
+        return TemplateResponse(request, 'admin/store/product/import.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+            'title': 'Import products',
+        })
 
 # Order Admin (UPDATED)
 class OrderAdmin(admin.ModelAdmin):
@@ -24,10 +86,16 @@ class OrderAdmin(admin.ModelAdmin):
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ['order', 'product', 'quantity', 'price', 'get_total_price']
     list_filter = ['order__status']
-    
+    list_select_related = ['order__user', 'product']
+
+    def get_queryset(self, request):
+        # Line totals come from the database, and the column can be sorted on
+        return super().get_queryset(request).annotate(total_price=ExpressionWrapper(
+            F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2)))
+
+    @admin.display(description='Total Price', ordering='total_price')
     def get_total_price(self, obj):
-        return obj.quantity * obj.price
-    get_total_price.short_description = 'Total Price'
+        return obj.total_price
 
 # Cart Admin
 class CartAdmin(admin.ModelAdmin):
@@ -51,6 +119,71 @@ class AddressAdmin(admin.ModelAdmin):
     list_filter = ['city', 'state', 'is_default']
     search_fields = ['user__username', 'full_name', 'city']
 
+# Notification outbox - delivered by manage.py send_notifications (store/notifications.py)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'order', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['recipient', 'order__id']
+    list_select_related = ['order__user']
+    readonly_fields = ['kind', 'order', 'recipient', 'payload', 'attempts', 'last_error', 'created_at', 'sent_at']
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected notifications now')
+    def retry_now(self, request, queryset):
+        count = queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now(),
+                                                       claimed_by='')
+        self.message_user(request, f'{count} notification(s) queued again.', messages.SUCCESS)
+
+# Sales dashboard - reads only the rollup tables (store/rollups.py)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/store/dailysales/dashboard.html'
+    PERIODS = [7, 30, 90, 365]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        days = days if days in self.PERIODS else 30
+        since = timezone.localdate() - timedelta(days=days - 1)
+        sums = {'orders': Sum('orders'), 'units': Sum('units'), 'revenue': Sum('revenue')}
+
+        # Cancelled orders only show up in the by-status table
+        sales = DailySales.objects.filter(date__gte=since)
+        kept = sales.exclude(status='cancelled')
+        products = DailyProductSales.objects.filter(date__gte=since).exclude(status='cancelled')
+        categories = DailyCategorySales.objects.filter(date__gte=since).exclude(status='cancelled')
+        by_day = list(kept.values('date').annotate(**sums).order_by('-date'))
+        peak = max((row['revenue'] for row in by_day), default=0) or 1
+        for row in by_day:
+            row['share'] = round(row['revenue'] / peak * 100)
+
+        return TemplateResponse(request, self.change_list_template, {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Sales dashboard',
+            'days': days,
+            'periods': self.PERIODS,
+            'totals': kept.aggregate(**sums),
+            'by_day': by_day,
+            'by_status': sales.values('status').annotate(**sums).order_by('-revenue'),
+            'top_products': products.values('product_id', 'product__name').annotate(**sums)
+                                    .order_by('-revenue')[:10],
+            'by_category': categories.values('category__name').annotate(**sums).order_by('-revenue'),
+            **(extra_context or {}),
+        })
+
 # Register your models with custom admin
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Product, ProductAdmin)
@@ -59,4 +192,6 @@ admin.site.register(OrderItem, OrderItemAdmin)
 admin.site.register(Cart, CartAdmin)
 admin.site.register(CartItem, CartItemAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
-admin.site.register(Address, AddressAdmin)
\ No newline at end of file
+admin.site.register(Address, AddressAdmin)
+admin.site.register(DailySales, SalesDashboardAdmin)
+admin.site.register(Notification, NotificationAdmin)
\ No newline at end of file
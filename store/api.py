@@ -0,0 +1,323 @@
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Sum
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition
+
+from .conditional import catalog_cache, listing_etag, private_cache, product_etag
+from .guest_cart import GuestCart
+from .models import LINE_TOTAL, Cart, CartItem, Category, Order, OrderItem, Product
+from .pagination import paginate_keyset
+from .routers import read_from_replica
+from .search import filtered_search_page
+from .services import update_cart_lines
+from .sqlite import serialize_writes
+
+# JSON API, version 1 (mounted at /api/v1/). Every list takes ?fields= to pick
+# the keys it returns; the query loads only the columns and joins those keys
+# need, so each call costs the same small number of queries whatever the page.
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(methods=('GET',)):
+    """JSON errors instead of HTML pages, and a JSON 405 for other methods"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = JsonResponse({'error': f'{request.method} not allowed'}, status=405)
+                response['Allow'] = ', '.join(methods)
+                return response
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as e:
+                return JsonResponse({'error': str(e)}, status=e.status)
+        return wrapper
+    return decorator
+
+
+def login_required_api(request):
+    if not request.user.is_authenticated:
+        raise ApiError('Authentication required', status=401)
+
+
+# Field sets
+class Field:
+    """One key of a resource: how to read it, and the columns/joins it needs"""
+
+    def __init__(self, value, columns=(), related=()):
+        self.value = value
+        self.columns = columns
+        self.related = related
+
+
+def _url(image):
+    return image.url if image else None
+
+
+def _money(value):
+    # SQLite sums decimals without their scale, so format rather than str()
+    return f'{value:.2f}'
+
+
+class Resource:
+    def __init__(self, fields, default, always=('id',)):
+        self.fields = fields
+        self.default = default
+        self.always = always
+
+    def parse_fields(self, request):
+        raw = request.GET.get('fields')
+        if not raw:
+            return self.default
+        names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f"Unknown field(s) {', '.join(unknown)}; "
+                           f"available: {', '.join(self.fields)}")
+        return names
+
+    def queryset(self, queryset, names):
+        columns = set(self.always)
+        related = set()
+        for name in names:
+            columns.update(self.fields[name].columns)
+            related.update(self.fields[name].related)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*columns)
+
+    def serialize(self, obj, names):
+        return {name: self.fields[name].value(obj) for name in names}
+
+
+PRODUCT = Resource({
+    'id': Field(lambda p: p.id, ['id']),
+    'name': Field(lambda p: p.name, ['name']),
+    'description': Field(lambda p: p.description, ['description']),
+    'price': Field(lambda p: str(p.price), ['price']),
+    'stock': Field(lambda p: p.stock, ['stock']),
+    'image': Field(lambda p: _url(p.image), ['image']),
+    'created_at': Field(lambda p: p.created_at.isoformat(), ['created_at']),
+    'category_id': Field(lambda p: p.category_id, ['category']),
+    'category': Field(lambda p: {'id': p.category.id, 'name': p.category.name},
+                      ['category', 'category__id', 'category__name'], ['category']),
+    'url': Field(lambda p: reverse('product_detail', args=[p.id]), ['id']),
+}, default=['id', 'name', 'price', 'image', 'category_id'], always=('id', 'created_at'))
+
+CATEGORY = Resource({
+    'id': Field(lambda c: c.id, ['id']),
+    'name': Field(lambda c: c.name, ['name']),
+    'description': Field(lambda c: c.description, ['description']),
+}, default=['id', 'name'])
+
+CART_LINE = Resource({
+    'id': Field(lambda line: line.id, ['id']),
+    'product_id': Field(lambda line: line.product_id, ['product']),
+    'quantity': Field(lambda line: line.quantity, ['quantity']),
+    'line_total': Field(lambda line: _money(line.line_total), ['quantity']),
+    'product': Field(lambda line: {'id': line.product.id, 'name': line.product.name,
+                                   'price': str(line.product.price), 'image': _url(line.product.image)},
+                     ['product', 'product__id', 'product__name', 'product__price', 'product__image'], ['product']),
+}, default=['product_id', 'quantity', 'line_total'])
+
+ORDER = Resource({
+    'id': Field(lambda o: o.id, ['id']),
+    'status': Field(lambda o: o.status, ['status']),
+    'total_price': Field(lambda o: str(o.total_price), ['total_price']),
+    'item_count': Field(lambda o: o.item_count, ['item_count']),
+    'line_count': Field(lambda o: o.line_count, ['line_count']),
+    'payment_method': Field(lambda o: o.payment_method, ['payment_method']),
+    'payment_status': Field(lambda o: o.payment_status, ['payment_status']),
+    'thumbnail': Field(lambda o: _url(o.thumbnail), ['thumbnail']),
+    'created_at': Field(lambda o: o.created_at.isoformat(), ['created_at']),
+    'updated_at': Field(lambda o: o.updated_at.isoformat(), ['updated_at']),
+    # Filled in by attach_order_items, one query for the whole page
+    'items': Field(lambda o: o.api_items, []),
+}, default=['id', 'status', 'total_price', 'item_count', 'created_at'], always=('id', 'created_at'))
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', 0))
+    except ValueError:
+        raise ApiError('limit must be a number')
+    return min(size, getattr(settings, 'STORE_API_MAX_PAGE_SIZE', 100)) if size > 0 else None
+
+
+def page_response(page, resource, names):
+    return JsonResponse({
+        'results': [resource.serialize(obj, names) for obj in page],
+        'next_cursor': page.next_cursor,
+    })
+
+
+# Catalog
+@api_view()
+@catalog_cache
+@condition(etag_func=listing_etag)
+@read_from_replica
+def products(request):
+    names = PRODUCT.parse_fields(request)
+    queryset = PRODUCT.queryset(Product.objects.all(), names)
+    if request.GET.get('category'):
+        try:
+            queryset = queryset.filter(category_id=int(request.GET['category']))
+        except ValueError:
+            raise ApiError('category must be a number')
+
+    query = request.GET.get('q', '')
+    if not query:
+        return page_response(paginate_keyset(queryset, request.GET.get('cursor'), page_size(request)),
+                             PRODUCT, names)
+    # Search ranks by relevance; the cursor is the rank offset, as on the search page
+    return page_response(filtered_search_page(query, queryset, request.GET.get('cursor'), page_size(request)),
+                         PRODUCT, names)
+
+
+@api_view()
+@catalog_cache
+@condition(etag_func=product_etag)
+@read_from_replica
+def product(request, product_id):
+    names = PRODUCT.parse_fields(request)
+    obj = PRODUCT.queryset(Product.objects.filter(id=product_id), names).first()
+    if obj is None:
+        raise ApiError('Product not found', status=404)
+    return JsonResponse(PRODUCT.serialize(obj, names))
+
+
+@api_view()
+@catalog_cache
+@read_from_replica
+def categories(request):
+    """All categories in one response - the list is short, so it is not paginated"""
+    names = CATEGORY.parse_fields(request)
+    queryset = CATEGORY.queryset(Category.objects.order_by('id'), names)
+    return JsonResponse({'results': [CATEGORY.serialize(obj, names) for obj in queryset]})
+
+
+# Cart - the logged-in user's Cart, or the session cart for guests
+def cart_payload(request, cart, names):
+    if isinstance(cart, GuestCart):
+        summary = cart.summary()
+        lines, subtotal, item_count = summary.items, summary.subtotal, summary.item_count
+    else:
+        items = CartItem.objects.filter(cart=cart)
+        lines = CART_LINE.queryset(items, names).annotate(line_total=LINE_TOTAL).order_by('added_at', 'id')
+        totals = items.aggregate(subtotal=Sum(LINE_TOTAL), item_count=Sum('quantity'))
+        subtotal, item_count = totals['subtotal'] or 0, totals['item_count'] or 0
+    return JsonResponse({
+        'items': [CART_LINE.serialize(line, names) for line in lines],
+        'subtotal': _money(subtotal),
+        'item_count': item_count,
+    })
+
+
+def current_cart(request):
+    if request.user.is_authenticated:
+        cart, created = Cart.objects.get_or_create(user=request.user)
+        return cart
+    return GuestCart(request)
+
+
+@api_view()
+@private_cache
+def cart(request):
+    return cart_payload(request, current_cart(request), CART_LINE.parse_fields(request))
+
+
+def parse_lines(request):
+    """{"items": [{"product_id": 1, "quantity": 2}, ...]} as {product_id: quantity}"""
+    try:
+        items = json.loads(request.body or b'{}')['items']
+        quantities = {}
+        for item in items:
+            product_id, quantity = int(item['product_id']), int(item.get('quantity', 1))
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+    except (ValueError, KeyError, TypeError):
+        raise ApiError('Expected {"items": [{"product_id": <id>, "quantity": <n>}, ...]}')
+    if not quantities:
+        raise ApiError('No items given')
+    max_batch = getattr(settings, 'STORE_API_MAX_BATCH', 100)
+    if len(quantities) > max_batch:
+        raise ApiError(f'At most {max_batch} products per call')
+
+    known = set(Product.objects.filter(id__in=quantities).values_list('id', flat=True))
+    missing = sorted(set(quantities) - known)
+    if missing:
+        raise ApiError(f"Unknown product id(s): {', '.join(map(str, missing))}", status=404)
+    return quantities
+
+
+@api_view(methods=('POST', 'PUT'))
+@private_cache
+@serialize_writes
+def cart_items(request):
+    """
+    Batch cart update. POST adds the quantities to the cart, PUT sets them
+    (quantity 0 removes the line). Answers with the updated cart.
+    """
+    replace = request.method == 'PUT'
+    quantities = parse_lines(request)
+    if not replace and any(quantity <= 0 for quantity in quantities.values()):
+        raise ApiError('Quantities must be positive')
+
+    cart = current_cart(request)
+    if isinstance(cart, GuestCart):
+        # All or nothing: check the line limit before touching the session
+        if not cart.has_room([product_id for product_id, quantity in quantities.items() if quantity > 0]):
+            raise ApiError('Guest cart is full, log in to add more products')
+        for product_id, quantity in quantities.items():
+            if not replace or not cart.set_quantity(product_id, quantity):
+                if quantity > 0:
+                    cart.add(product_id, quantity)
+    else:
+        update_cart_lines(cart, quantities, replace=replace)
+    return cart_payload(request, cart, CART_LINE.parse_fields(request))
+
+
+# Orders
+def attach_order_items(orders):
+    items = {}
+    for item in (OrderItem.objects.filter(order__in=orders).select_related('product')
+                 .only('order_id', 'quantity', 'price', 'product__id', 'product__name')):
+        items.setdefault(item.order_id, []).append({
+            'product_id': item.product.id, 'name': item.product.name,
+            'quantity': item.quantity, 'price': str(item.price),
+        })
+    for order in orders:
+        order.api_items = items.get(order.id, [])
+
+
+@api_view()
+@private_cache
+def orders(request):
+    login_required_api(request)
+    names = ORDER.parse_fields(request)
+    page = paginate_keyset(ORDER.queryset(Order.objects.filter(user=request.user), names),
+                           request.GET.get('cursor'), page_size(request))
+    if 'items' in names:
+        attach_order_items(page.items)
+    return page_response(page, ORDER, names)
+
+
+@api_view()
+@private_cache
+def order(request, order_id):
+    login_required_api(request)
+    names = ORDER.parse_fields(request)
+    obj = ORDER.queryset(Order.objects.filter(id=order_id, user=request.user), names).first()
+    if obj is None:
+        raise ApiError('Order not found', status=404)
+    if 'items' in names:
+        attach_order_items([obj])
+    return JsonResponse(ORDER.serialize(obj, names))
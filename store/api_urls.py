@@ -0,0 +1,12 @@
+from django.urls import path
+from . import api
+
+urlpatterns = [
+    path('products/', api.products, name='api_products'),
+    path('products/<int:product_id>/', api.product, name='api_product'),
+    path('categories/', api.categories, name='api_categories'),
+    path('cart/', api.cart, name='api_cart'),
+    path('cart/items/', api.cart_items, name='api_cart_items'),
+    path('orders/', api.orders, name='api_orders'),
+    path('orders/<int:order_id>/', api.order, name='api_order'),
+]
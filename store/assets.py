@@ -0,0 +1,125 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# ManifestStaticFilesStorage puts a 12 hex digit content hash before the extension
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _read_range(path, start, length, chunk_size=64 * 1024):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+def serve_file(request, root, path, cache_control, precompressed=False):
+    """
+    Serve a file from disk with ETag/Last-Modified validation, single-range
+    requests and, for static assets, precompressed .br/.gz variants. Full
+    responses go through FileResponse so the WSGI server can use sendfile.
+    """
+    try:
+        full_path = safe_join(root, path)
+        st = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('File not found')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('File not found')
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    range_header = request.headers.get('Range')
+    encoding = None
+    if precompressed and not range_header:
+        accepted = request.headers.get('Accept-Encoding', '')
+        for name, suffix in ENCODINGS:
+            if name in accepted and os.path.exists(full_path + suffix):
+                full_path, encoding = full_path + suffix, name
+                st = os.stat(full_path)
+                break
+
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-" + encoding if encoding else ""}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(st.st_mtime),
+        'Cache-Control': cache_control,
+        'Accept-Ranges': 'bytes',
+    }
+    if precompressed:
+        headers['Vary'] = 'Accept-Encoding'
+
+    if _not_modified(request, etag, st.st_mtime):
+        response = HttpResponseNotModified()
+        for key, value in headers.items():
+            response[key] = value
+        return response
+
+    # If-Range with a stale validator means "send me the whole new file"
+    if range_header and request.headers.get('If-Range', etag) != etag:
+        range_header = None
+
+    if range_header:
+        match = RANGE_RE.match(range_header.strip())
+        size = st.st_size
+        if match and match.group(1) + match.group(2):
+            first, last = match.groups()
+            if first:
+                start, end = int(first), min(int(last), size - 1) if last else size - 1
+            else:
+                # Suffix range: the last N bytes
+                start, end = max(size - int(last), 0), size - 1
+            if start <= end < size:
+                response = StreamingHttpResponse(_read_range(full_path, start, end - start + 1),
+                                                 status=206, content_type=content_type)
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+                response['Content-Length'] = str(end - start + 1)
+                for key, value in headers.items():
+                    response[key] = value
+                return response
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    for key, value in headers.items():
+        response[key] = value
+    return response
+
+
+@require_safe
+def serve_static(request, path):
+    # Hashed names never change content, so they can be cached forever
+    if HASHED_NAME_RE.search(path):
+        cache_control = f'public, max-age={settings.STORE_STATIC_MAX_AGE}, immutable'
+    else:
+        cache_control = 'public, max-age=0, must-revalidate'
+    return serve_file(request, settings.STATIC_ROOT, path, cache_control, precompressed=True)
+
+
+@require_safe
+def serve_media(request, path):
+    return serve_file(request, settings.MEDIA_ROOT, path, f'public, max-age={settings.STORE_MEDIA_MAX_AGE}')
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import async_views
+
+# Same routes and names as store/urls.py; listed first under ASGI so they win
+urlpatterns = [
+    path('', async_views.home, name='home'),
+    path('product/<int:product_id>/', async_views.product_detail, name='product_detail'),
+    path('search/', async_views.search_products, name='search_products'),
+    path('cart/', async_views.cart_view, name='cart_view'),
+]
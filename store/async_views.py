@@ -0,0 +1,91 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404, render
+from django.views.decorators.http import condition
+
+from .cache import attach_card_fragments, cached_categories
+from .conditional import catalog_cache, listing_etag, product_etag
+from .guest_cart import GuestCart
+from .models import Cart, Product
+from .pagination import apaginate_products, page_as_json
+from .routers import read_from_replica
+from .search import asearch_page
+from .views import wants_json
+
+# Async versions of the read-heavy views, served under ASGI (ecommerce/asgi_urls.py).
+# Independent lookups are awaited together; Django runs a request's ORM calls on
+# one worker thread, so they overlap with cache round trips and other requests
+# rather than running as parallel SQL. Card rendering stays synchronous code in
+# that same worker thread.
+acached_categories = sync_to_async(cached_categories)
+aattach_card_fragments = sync_to_async(attach_card_fragments)
+
+
+# Home Page View - Product listings with categories
+@catalog_cache
+@condition(etag_func=listing_etag)
+@read_from_replica
+async def home(request):
+    if wants_json(request):
+        products = await apaginate_products(Product.objects.all(), request.GET.get('cursor'))
+        return JsonResponse(page_as_json(products))
+    products, categories = await asyncio.gather(
+        apaginate_products(Product.objects.all(), request.GET.get('cursor')),
+        acached_categories(),
+    )
+    await aattach_card_fragments(products)
+    return render(request, 'home.html', {
+        'products': products,
+        'categories': categories
+    })
+
+
+# Product Details Page - the category comes in the same query
+@catalog_cache
+@condition(etag_func=product_etag)
+@read_from_replica
+async def product_detail(request, product_id):
+    product = await aget_object_or_404(Product.objects.select_related('category'), id=product_id)
+    return render(request, 'product_detail.html', {
+        'product': product
+    })
+
+
+# Search Products
+@catalog_cache
+@condition(etag_func=listing_etag)
+@read_from_replica
+async def search_products(request):
+    query = request.GET.get('q', '')
+    if query:
+        results = asearch_page(query, request.GET.get('cursor'))
+    else:
+        results = apaginate_products(Product.objects.all(), request.GET.get('cursor'))
+    if wants_json(request):
+        return JsonResponse(page_as_json(await results))
+    products, categories = await asyncio.gather(results, acached_categories())
+    await aattach_card_fragments(products)
+    return render(request, 'products.html', {
+        'products': products,
+        'categories': categories,
+        'query': query
+    })
+
+
+# Cart View Page - guests read the session, users their Cart
+async def cart_view(request):
+    request.user = await request.auser()
+    if request.user.is_authenticated:
+        cart, created = await Cart.objects.aget_or_create(user=request.user)
+    else:
+        cart = await GuestCart.aload(request)
+    summary = await cart.asummary()
+
+    return render(request, 'cart/cart.html', {
+        'cart_items': summary.items,
+        'total_price': summary.subtotal,
+        'item_count': summary.item_count,
+        'user': request.user
+    })
@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .models import UserProfile
+
+
+class ProfileModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user - run by AuthenticationMiddleware on every
+    signed-in request - loads the user with their UserProfile in one joined
+    query, so pages reading the profile need no second one. Nothing is
+    cached: password changes and deactivations apply on the next request.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = get_user_model()._default_manager.select_related('userprofile').get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await get_user_model()._default_manager.select_related('userprofile').aget(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+def profile_for(user):
+    """The user's profile, normally preloaded by get_user; created if a bulk insert skipped it"""
+    try:
+        return user.userprofile
+    except UserProfile.DoesNotExist:
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        return profile
@@ -0,0 +1,272 @@
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from .models import Cart, CartItem, Category, Order, OrderItem, Product, UserProfile
+from .search import get_search_backend, indexable_rows
+from .suggest import suggestion_index
+from .services import place_order
+
+WORDS = [
+    'cotton', 'shirt', 'denim', 'jacket', 'wireless', 'headphones', 'steel',
+    'bottle', 'leather', 'wallet', 'running', 'shoes', 'smart', 'watch',
+    'organic', 'tea', 'ceramic', 'mug', 'gaming', 'mouse', 'laptop', 'stand',
+    'yoga', 'mat', 'kitchen', 'knife', 'bamboo', 'towel', 'desk', 'lamp',
+    'portable', 'speaker', 'silk', 'saree', 'kurta', 'backpack', 'charger',
+    'notebook', 'pen', 'sunglasses', 'perfume', 'rice', 'masala', 'blender',
+]
+# Every seeded account logs in with this, so load tests can sign in as any of them
+PASSWORD = 'benchmark-pass'
+
+
+@contextmanager
+def scratch_database(alias='default', name=None, verbosity=0):
+    """
+    Run a benchmark against a throwaway test database so seeding millions of
+    rows never touches real data. Pass a file name to get a file-backed
+    SQLite database instead of the shared in-memory one.
+    """
+    connection = connections[alias]
+    old_name = connection.settings_dict['NAME']
+    if name:
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = name
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    # Signal handlers must not write the scratch catalog into the real search index
+    search = override_settings(STORE_SEARCH={'BACKEND': 'store.search.FTS5SearchBackend',
+                                             'OPTIONS': {'path': ':memory:'}})
+    search.enable()
+    # Lets the test client talk to the views (ALLOWED_HOSTS, locmem email)
+    setup_test_environment(debug=False)
+    try:
+        yield connection
+    finally:
+        teardown_test_environment()
+        search.disable()
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def seed_catalog(products, categories=20, batch_size=5000, seed=0):
+    """Bulk-insert categories and products up to the requested totals"""
+    rng = random.Random(seed)
+    existing = list(Category.objects.all())
+    new_categories = [
+        Category(name=f'{sentence(rng, 1).title()} {i}')
+        for i in range(len(existing), categories)
+    ]
+    existing += Category.objects.bulk_create(new_categories)
+
+    start = Product.objects.count()
+    for offset in range(start, products, batch_size):
+        Product.objects.bulk_create([
+            Product(
+                name=f'{sentence(rng, 3).title()} {i}',
+                description=sentence(rng, 25),
+                price=Decimal(rng.randint(100, 100000)) / 100,
+                category=rng.choice(existing),
+                stock=rng.randint(0, 500),
+            )
+            for i in range(offset, min(offset + batch_size, products))
+        ])
+
+
+def seed_users(count, prefix='user', batch_size=5000):
+    """Users {prefix}0..{prefix}N-1, sharing one password hash (hashing each would dominate)"""
+    password = make_password(PASSWORD)
+    existing = set(User.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+    User.objects.bulk_create([
+        User(username=f'{prefix}{i}', password=password)
+        for i in range(count) if f'{prefix}{i}' not in existing
+    ], batch_size=batch_size)
+    users = list(User.objects.filter(username__in=[f'{prefix}{i}' for i in range(count)]).order_by('id'))
+    # bulk_create skips the post_save signal that gives each account its profile
+    UserProfile.objects.bulk_create([UserProfile(user=user) for user in users], batch_size=batch_size,
+                                    ignore_conflicts=True)
+    return users
+
+
+def seed_orders(users, orders, max_lines=4, batch_size=2000, seed=0):
+    """
+    Order history written straight to the tables, summary fields included.
+    Stock is not touched - this is past data, not checkouts.
+    """
+    rng = random.Random(seed)
+    products = list(Product.objects.order_by('id').values_list('id', 'price', 'image')[:10_000])
+    statuses = [status for status, _ in Order.ORDER_STATUS]
+    for offset in range(0, orders, batch_size):
+        batch = []
+        for _ in range(min(batch_size, orders - offset)):
+            lines = [(product, rng.randint(1, 3))
+                     for product in rng.sample(products, min(len(products), rng.randint(1, max_lines)))]
+            order = Order(
+                user=rng.choice(users),
+                status=rng.choice(statuses),
+                payment_method=rng.choice(['card', 'cod']),
+                total_price=sum((price * quantity for (_, price, _), quantity in lines), Decimal('0.00')),
+                item_count=sum(quantity for _, quantity in lines),
+                line_count=len(lines),
+                thumbnail=lines[0][0][2],
+            )
+            batch.append((order, lines))
+        Order.objects.bulk_create([order for order, _ in batch])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product_id, quantity=quantity, price=price)
+            for order, lines in batch
+            for (product_id, price, _), quantity in lines
+        ])
+
+
+def seed_carts(users, lines=3, seed=0):
+    """A cart with distinct product lines for each user that has none yet"""
+    rng = random.Random(seed)
+    product_ids = list(Product.objects.order_by('id').values_list('id', flat=True)[:10_000])
+    has_cart = set(Cart.objects.filter(user__in=users).values_list('user_id', flat=True))
+    carts = Cart.objects.bulk_create([Cart(user=user) for user in users if user.id not in has_cart])
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product_id=product_id, quantity=rng.randint(1, 3))
+        for cart in carts
+        for product_id in rng.sample(product_ids, min(lines, len(product_ids)))
+    ])
+
+
+def seed_store(categories=20, products=1000, users=50, orders=200, carts=25, cart_lines=3, seed=0):
+    """A whole store of the requested size; the same seed always gives the same data"""
+    seed_catalog(products, categories=categories, seed=seed)
+    accounts = seed_users(users)
+    if accounts:
+        seed_orders(accounts, orders, seed=seed)
+        seed_carts(accounts[:carts], lines=cart_lines, seed=seed)
+    # bulk_create sends no signals, so the search index is filled in one go
+    get_search_backend().rebuild(indexable_rows(Product.objects.all()))
+    suggestion_index.mark_stale()
+    return {
+        'categories': Category.objects.count(),
+        'products': Product.objects.count(),
+        'users': User.objects.count(),
+        'orders': Order.objects.count(),
+        'carts': Cart.objects.count(),
+    }
+
+
+def seed_shopper(username='shopper', orders=3, cart_lines=3, seed=0):
+    """A user with past orders and a filled cart, for exercising the account pages"""
+    rng = random.Random(seed)
+    user = User.objects.create_user(username, password=PASSWORD)
+    cart = Cart.objects.create(user=user)
+    products = list(Product.objects.filter(stock__gt=0).order_by('?')[:orders + cart_lines])
+    Product.objects.filter(id__in=[product.id for product in products]).update(stock=10_000)
+    for product in products[:orders]:
+        CartItem.objects.create(cart=cart, product=product, quantity=rng.randint(1, 3))
+        place_order(user, cart)
+    CartItem.objects.bulk_create([CartItem(cart=cart, product=product) for product in products[orders:]])
+    return user
+
+
+def measure(fn, repeat=20):
+    """Call fn repeatedly and return latency statistics in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    if not timings:
+        return {'mean_ms': None, 'p50_ms': None, 'p95_ms': None}
+    return {
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(timings[len(timings) // 2], 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+    }
+
+
+# Result files - {'meta': ..., 'results': {name: {p50_ms, queries, ...}}} so runs
+# from different commits can be diffed with compare_runs
+def run_metadata(**extra):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connections['default'].vendor,
+        **extra,
+    }
+
+
+def compare_runs(baseline, current, tolerance=0.25, min_ms=1.0):
+    """
+    Regressions of current against baseline: any extra query, or a p50 more
+    than `tolerance` slower (and at least min_ms, so timer noise on fast
+    views does not count).
+    """
+    regressions = []
+    for name, now in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        if now.get('queries') is not None and before.get('queries') is not None \
+                and now['queries'] > before['queries']:
+            regressions.append(f"{name}: {before['queries']} -> {now['queries']} queries")
+        if now.get('p50_ms') is not None and before.get('p50_ms') is not None:
+            slower = now['p50_ms'] - before['p50_ms']
+            if slower > min_ms and slower > before['p50_ms'] * tolerance:
+                regressions.append(f"{name}: p50 {before['p50_ms']}ms -> {now['p50_ms']}ms")
+    return regressions
+
+
+def add_report_arguments(parser):
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p50 slowdown (0.25 = 25%%)')
+    parser.add_argument('--fail-on-regression', action='store_true')
+
+
+def write_report(command, run, options, columns=('p50_ms', 'p95_ms', 'queries')):
+    """Print, save and compare a {'meta', 'results'} run for a benchmark command"""
+    if options['output']:
+        with open(options['output'], 'w') as f:
+            json.dump(run, f, indent=2)
+    if options['json']:
+        command.stdout.write(json.dumps(run, indent=2))
+    else:
+        command.stdout.write(f"{'':<28}" + ''.join(f'{column:>14}' for column in columns))
+        for name, result in run['results'].items():
+            values = ''.join(f"{'-' if result.get(column) is None else result[column]:>14}" for column in columns)
+            command.stdout.write(f'{name:<28}{values}')
+
+    if options['compare']:
+        with open(options['compare']) as f:
+            baseline = json.load(f)
+        regressions = compare_runs(baseline, run, tolerance=options['tolerance'])
+        for regression in regressions:
+            command.stderr.write(command.style.WARNING(f'Regression: {regression}'))
+        if not regressions:
+            command.stderr.write(command.style.SUCCESS(f"No regressions against {baseline['meta'].get('commit')}"))
+        elif options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Category
+
+
+def fragment_cache():
+    return caches[getattr(settings, 'STORE_FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+def fragment_timeout():
+    # Versions expire too: on a per-process cache another worker's bump never
+    # arrives, so this bounds how long that worker serves what it has
+    return getattr(settings, 'STORE_FRAGMENT_TIMEOUT', 86400)
+
+
+# Hit/miss counters per fragment kind, kept per process
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, kind, hits=0, misses=0):
+        with self._lock:
+            self._counts[kind]['hits'] += hits
+            self._counts[kind]['misses'] += misses
+
+    def snapshot(self):
+        with self._lock:
+            stats = {}
+            for kind, counts in self._counts.items():
+                total = counts['hits'] + counts['misses']
+                stats[kind] = {**counts, 'hit_ratio': counts['hits'] / total if total else 0.0}
+            return stats
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+cache_stats = CacheStats()
+
+
+# Versions - a fresh token on every change so old fragment keys are never read again.
+# A version evicted from the cache is replaced by a new token, never reset to an old one.
+def _version_key(kind, pk=None):
+    return f'store:v:{kind}' if pk is None else f'store:v:{kind}:{pk}'
+
+
+def get_versions(kind, pks):
+    cache = fragment_cache()
+    keys = {_version_key(kind, pk): pk for pk in pks}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=fragment_timeout())
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_version(kind, pk=None):
+    fragment_cache().set(_version_key(kind, pk), time.time_ns(), timeout=fragment_timeout())
+
+
+def bump_versions(kind, pks):
+    version = time.time_ns()
+    fragment_cache().set_many({_version_key(kind, pk): version for pk in pks}, timeout=fragment_timeout())
+
+
+# Category bar - the whole list shares one version, bumped by any category change
+def cached_categories():
+    cache = fragment_cache()
+    version = get_versions('categories', [None])[None]
+    key = f'store:categories:{version}'
+    categories = cache.get(key)
+    if categories is None:
+        cache_stats.record('categories', misses=1)
+        categories = list(Category.objects.order_by('id').values('id', 'name'))
+        cache.set(key, categories, timeout=fragment_timeout())
+    else:
+        cache_stats.record('categories', hits=1)
+    return categories
+
+
+# Product cards - rendered once per product version, two cache round trips per page
+def attach_card_fragments(products, template='includes/product_card.html'):
+    cache = fragment_cache()
+    products = list(products)
+    versions = get_versions('product', [product.id for product in products])
+    keys = {product.id: f'store:card:{product.id}:{versions[product.id]}' for product in products}
+    found = cache.get_many(keys.values())
+
+    rendered = {}
+    for product in products:
+        html = found.get(keys[product.id])
+        if html is None:
+            html = render_to_string(template, {'product': product})
+            rendered[keys[product.id]] = html
+        product.card_html = mark_safe(html)
+    if rendered:
+        cache.set_many(rendered, timeout=fragment_timeout())
+    cache_stats.record('product_card', hits=len(products) - len(rendered), misses=len(rendered))
+    return products
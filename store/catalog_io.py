@@ -0,0 +1,243 @@
+import csv
+import io
+import json
+import os
+import re
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from .cache import bump_version, bump_versions
+from .models import Category, Product
+from .search import get_search_backend
+from .suggest import suggestion_index
+
+# Bulk catalog import/export. Files are CSV or JSON Lines with these columns;
+# `image` is a name already in storage (what export writes), `image_url` is
+# downloaded. Rows are matched on sku: known skus are updated, new ones created.
+COLUMNS = ['sku', 'name', 'description', 'price', 'stock', 'category', 'image', 'image_url']
+FORMATS = ('csv', 'jsonl')
+UPSERT_FIELDS = ['name', 'description', 'price', 'stock', 'category']
+MAX_REPORTED_ERRORS = 20
+
+
+def guess_format(path):
+    return 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv'
+
+
+def read_rows(stream, fmt):
+    """(line number, dict) pairs from a text stream, one row in memory at a time"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else {'_invalid': line}
+
+
+class _Echo:
+    # csv.writer returns whatever write() returns, so each row comes back as a line
+    def write(self, value):
+        return value
+
+
+def format_rows(rows, fmt):
+    """Rows as lines of text, for files and streaming responses alike"""
+    if fmt == 'csv':
+        writer = csv.DictWriter(_Echo(), COLUMNS, extrasaction='ignore')
+        yield writer.writeheader()
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(row) + '\n'
+
+
+def write_rows(stream, rows, fmt):
+    stream.writelines(format_rows(rows, fmt))
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Products as import rows, streamed from a server-side iterator"""
+    columns = queryset.order_by('id').values_list('sku', 'name', 'description', 'price', 'stock',
+                                                 'category__name', 'image')
+    for sku, name, description, price, stock, category, image in columns.iterator(chunk_size=chunk_size):
+        yield {
+            'sku': sku or '', 'name': name, 'description': description, 'price': str(price),
+            'stock': stock, 'category': category, 'image': image or '', 'image_url': '',
+        }
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def parse_row(row):
+    """Validated field values for one input row; raises ValueError"""
+    if '_invalid' in row:
+        raise ValueError('not a JSON object')
+    sku = str(row.get('sku') or '').strip()
+    name = str(row.get('name') or '').strip()
+    category = str(row.get('category') or '').strip()
+    if not (sku and name and category):
+        raise ValueError('sku, name and category are required')
+    if len(sku) > 64 or len(name) > 200 or len(category) > 100:
+        raise ValueError('sku, name or category is too long')
+    try:
+        price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+        stock = int(row.get('stock') or 0)
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError('price must be a decimal and stock an integer')
+    if price < 0 or price >= Decimal('1e8'):
+        raise ValueError('price out of range')
+    return {
+        'sku': sku, 'name': name, 'description': str(row.get('description') or ''), 'price': price,
+        'stock': stock, 'category': category, 'image': str(row.get('image') or '').strip(),
+        'image_url': str(row.get('image_url') or '').strip(),
+    }
+
+
+def download_image(url, sku):
+    """Fetch, check and store one product image; returns its storage name"""
+    if urlparse(url).scheme not in ('http', 'https'):
+        raise ValueError(f'unsupported image URL {url}')
+    limit = getattr(settings, 'STORE_IMPORT_MAX_IMAGE_BYTES', 10 * 1024 * 1024)
+    with urllib.request.urlopen(url, timeout=getattr(settings, 'STORE_IMPORT_IMAGE_TIMEOUT', 10)) as response:
+        data = response.read(limit + 1)
+    if len(data) > limit:
+        raise ValueError(f'image larger than {limit} bytes')
+    with Image.open(io.BytesIO(data)) as image:
+        fmt = image.format
+        image.verify()
+    extension = {'JPEG': 'jpg'}.get(fmt, fmt.lower())
+    return default_storage.save(f"products/{re.sub(r'[^A-Za-z0-9_-]+', '-', sku)}.{extension}", ContentFile(data))
+
+
+class CatalogImporter:
+    """
+    Upserts products chunk by chunk. Per chunk: one lookup of the existing
+    skus, parallel image downloads outside the transaction, then one
+    transaction with a bulk INSERT ... ON CONFLICT(sku) DO UPDATE, a bulk
+    update of the new image names and any missing categories. Categories are
+    resolved through a name -> id map loaded once. Bulk writes send no model
+    signals, so the search index and cache versions are updated here.
+    """
+
+    def __init__(self, batch_size=2000, workers=8, images=True):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.images = images
+        self.categories = {}
+        for pk, name in Category.objects.order_by('id').values_list('id', 'name'):
+            self.categories.setdefault(name, pk)
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'images': 0, 'skipped': 0}
+        self.errors = []
+
+    def error(self, line, message):
+        self.stats['skipped'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'line {line}: {message}')
+
+    def run(self, numbered_rows, progress=None):
+        pool = ThreadPoolExecutor(max_workers=self.workers) if self.images and self.workers else None
+        try:
+            for chunk in _chunks(numbered_rows, self.batch_size):
+                self.import_chunk(chunk, pool)
+                if progress:
+                    progress(self.stats)
+        finally:
+            if pool:
+                pool.shutdown()
+        suggestion_index.mark_stale()
+        bump_version('products')
+        return self.stats
+
+    def import_chunk(self, chunk, pool):
+        rows = {}
+        for line, raw in chunk:
+            self.stats['rows'] += 1
+            try:
+                row = parse_row(raw)
+            except ValueError as e:
+                self.error(line, e)
+                continue
+            # A sku repeated in one chunk: the last row wins, as it would across chunks
+            rows[row['sku']] = (line, row)
+        if not rows:
+            return
+
+        existing = {sku: (image, category_id) for sku, image, category_id in
+                    Product.objects.filter(sku__in=rows).values_list('sku', 'image', 'category_id')}
+        images = {sku: row['image'] for sku, (line, row) in rows.items() if row['image']}
+        # Only products without an image yet are downloaded
+        wanted = [(sku, line, row['image_url']) for sku, (line, row) in rows.items()
+                  if self.images and row['image_url'] and sku not in images and not existing.get(sku, ('',))[0]]
+        images.update(self.download(wanted, pool))
+
+        with transaction.atomic():
+            missing = {row['category'] for line, row in rows.values()} - set(self.categories)
+            for category in Category.objects.bulk_create([Category(name=name) for name in sorted(missing)]):
+                self.categories[category.name] = category.id
+            products = [
+                Product(sku=sku, name=row['name'], description=row['description'], price=row['price'],
+                        stock=row['stock'], category_id=self.categories[row['category']])
+                for sku, (line, row) in rows.items()
+            ]
+            Product.objects.bulk_create(products, update_conflicts=True, unique_fields=['sku'],
+                                        update_fields=UPSERT_FIELDS)
+            ids = dict(Product.objects.filter(sku__in=rows).values_list('sku', 'id'))
+            Product.objects.bulk_update([Product(id=ids[sku], image=name) for sku, name in images.items()],
+                                        ['image'])
+
+        self.stats['created'] += len(rows) - len(existing)
+        self.stats['updated'] += len(existing)
+        # Listings of the new and the previous categories both change
+        category_ids = {self.categories[row['category']] for line, row in rows.values()}
+        category_ids |= {category_id for image, category_id in existing.values()}
+        get_search_backend().index_products([
+            (ids[sku], row['name'], row['description'], row['category']) for sku, (line, row) in rows.items()
+        ])
+        bump_versions('product', list(ids.values()))
+        bump_versions('category', category_ids)
+        if missing:
+            bump_version('categories')
+
+    def download(self, wanted, pool):
+        if not wanted:
+            return {}
+
+        def fetch(item):
+            sku, line, url = item
+            try:
+                return sku, download_image(url, sku)
+            except (OSError, ValueError) as e:
+                return sku, e
+
+        results = pool.map(fetch, wanted) if pool else map(fetch, wanted)
+        stored = {}
+        for (sku, line, url), (_, result) in zip(wanted, results):
+            if isinstance(result, Exception):
+                # The product is still imported, just without its image
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append(f'line {line}: image {url}: {result}')
+            else:
+                stored[sku] = result
+                self.stats['images'] += 1
+        return stored
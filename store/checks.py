@@ -0,0 +1,38 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# Caches that live inside one process: every worker has its own copy
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def _process_local(alias):
+    return settings.CACHES.get(alias, {}).get('BACKEND') in PROCESS_LOCAL_CACHES
+
+
+@register()
+def check_session_cache(app_configs, **kwargs):
+    engine = settings.SESSION_ENGINE.rsplit('.', 1)[-1]
+    if engine in ('cache', 'cached_db') and _process_local(getattr(settings, 'SESSION_CACHE_ALIAS', 'default')):
+        return [Warning(
+            f'SESSION_ENGINE {settings.SESSION_ENGINE} is backed by a per-process LocMem cache.',
+            hint='With several workers a logout only reaches one of them. Set STORE_FRAGMENT_CACHE '
+                 'to a shared cache or use STORE_SESSIONS=db.',
+            id='store.W001',
+        )]
+    return []
+
+
+@register()
+def check_fragment_cache(app_configs, **kwargs):
+    workers = os.environ.get('WEB_CONCURRENCY', '1')
+    alias = getattr(settings, 'STORE_FRAGMENT_CACHE_ALIAS', 'default')
+    if workers.isdigit() and int(workers) > 1 and _process_local(alias):
+        return [Warning(
+            f'The fragment cache is per process but WEB_CONCURRENCY is {workers}.',
+            hint='Catalog edits only invalidate the worker that made them; the others serve stale cards '
+                 'and ETags for up to STORE_FRAGMENT_TIMEOUT. Set STORE_FRAGMENT_CACHE to a shared cache.',
+            id='store.W002',
+        )]
+    return []
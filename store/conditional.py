@@ -0,0 +1,105 @@
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from .cache import get_versions
+from .models import Order
+
+
+def viewer(request):
+    """
+    Who the page was rendered for. Logged-in pages embed a CSRF token, so
+    the token (hashed) is part of the validator and a re-login never
+    revalidates an old page.
+    """
+    if not request.user.is_authenticated:
+        return 'anon'
+    token = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return f'u{request.user.pk}-{hashlib.sha1(token.encode()).hexdigest()[:8]}'
+
+
+def _query_state(request):
+    return hashlib.sha1(request.get_full_path().encode() + request.headers.get('Accept', '').encode()).hexdigest()[:12]
+
+
+# ETag functions for django.views.decorators.http.condition - version tokens
+# come from the fragment cache, so a 304 costs no database query
+def product_etag(request, product_id):
+    # The page also shows the category name and the category bar. Version keys
+    # created here for ids that turn out not to exist expire with STORE_FRAGMENT_TIMEOUT.
+    version = get_versions('product', [product_id])[product_id]
+    categories = get_versions('categories', [None])[None]
+    return f'product-{product_id}-{version}-{categories}-{viewer(request)}'
+
+
+def category_etag(request, category_id):
+    versions = get_versions('category', [category_id])
+    categories = get_versions('categories', [None])[None]
+    return f'category-{category_id}-{versions[category_id]}-{categories}-{_query_state(request)}-{viewer(request)}'
+
+
+def listing_etag(request):
+    products = get_versions('products', [None])[None]
+    categories = get_versions('categories', [None])[None]
+    return f'listing-{products}-{categories}-{_query_state(request)}-{viewer(request)}'
+
+
+def _order_stamp(request, order_id):
+    # condition() asks for both validators, look the order up only once
+    if not hasattr(request, '_order_stamp'):
+        request._order_stamp = (Order.objects.filter(id=order_id, user=request.user)
+                                .values_list('updated_at', flat=True).first())
+    return request._order_stamp
+
+
+def order_etag(request, order_id):
+    updated_at = _order_stamp(request, order_id)
+    return f'order-{order_id}-{updated_at.timestamp()}' if updated_at else None
+
+
+def order_last_modified(request, order_id):
+    return _order_stamp(request, order_id)
+
+
+def catalog_cache(view):
+    """
+    Public caching for anonymous catalog pages, private for logged-in ones
+    (they carry a CSRF token and the user's name). Responses vary on Cookie
+    and on Accept because listings also answer JSON.
+    """
+    def patch(request, response):
+        if response.status_code in (200, 304):
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+            else:
+                patch_cache_control(response, public=True, max_age=settings.STORE_CATALOG_MAX_AGE)
+            patch_vary_headers(response, ['Cookie', 'Accept'])
+        return response
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # Resolve the user without a synchronous session/User query; the
+            # ETag functions and templates below read request.user
+            request.user = await request.auser()
+            return patch(request, await view(request, *args, **kwargs))
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return patch(request, view(request, *args, **kwargs))
+    return wrapper
+
+
+def private_cache(view):
+    """Per-user pages: browsers may keep them but must revalidate, shared caches never store them"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+    return wrapper
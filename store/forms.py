@@ -1,16 +1,31 @@
 from django import forms
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .uploads import max_upload_bytes, sniff_image
 
 class UserEditForm(forms.ModelForm):
     class Meta:
         model = User
         fields = ['email', 'first_name', 'last_name']
 
-class ProfilePictureForm(forms.ModelForm):
-    class Meta:
-        model = UserProfile
-        fields = ['profile_picture']
+class ProfilePictureForm(forms.Form):
+    # Checked from the header only, resizing happens on the image workers
+    profile_picture = forms.FileField(required=False)
+
+    def __init__(self, *args, too_large=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.too_large = too_large
+
+    def clean_profile_picture(self):
+        upload = self.cleaned_data['profile_picture']
+        if self.too_large:
+            raise forms.ValidationError(f'Photos can be at most {max_upload_bytes() // (1024 * 1024)} MB.')
+        if not upload:
+            raise forms.ValidationError('Choose a photo to upload.')
+        try:
+            sniff_image(upload)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return upload
 
 from .models import Address
 
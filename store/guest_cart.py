@@ -0,0 +1,125 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Cart, CartSummary, Product
+from .services import update_cart_lines
+
+SESSION_KEY = 'guest_cart'
+
+
+class GuestCartItem:
+    """A guest cart line shaped like CartItem for the cart templates"""
+
+    def __init__(self, product, quantity):
+        # Guest lines are addressed by product id in the cart URLs
+        self.id = product.id
+        self.product_id = product.id
+        self.product = product
+        self.quantity = quantity
+        self.line_total = quantity * product.price
+
+    def get_total_price(self):
+        return self.line_total
+
+
+class GuestCart:
+    """
+    Cart for anonymous visitors kept in the session as {product_id: quantity}.
+    Nothing is written to the database until the visitor logs in, so bots
+    and browsers that never buy leave no Cart or CartItem rows behind.
+    """
+
+    def __init__(self, request):
+        self.session = request.session
+        self.lines = dict(self.session.get(SESSION_KEY, {}))
+
+    def _save(self):
+        # Assigning marks the session modified, so only do it on a real change
+        if self.lines:
+            if self.session.get(SESSION_KEY) != self.lines:
+                self.session[SESSION_KEY] = dict(self.lines)
+        else:
+            self.session.pop(SESSION_KEY, None)
+
+    def has_room(self, product_ids):
+        """Whether all of these products fit under STORE_GUEST_CART_MAX_LINES"""
+        new = {str(product_id) for product_id in product_ids} - set(self.lines)
+        return len(self.lines) + len(new) <= getattr(settings, 'STORE_GUEST_CART_MAX_LINES', 50)
+
+    def add(self, product_id, quantity=1):
+        key = str(product_id)
+        if not self.has_room([key]):
+            return False
+        self.lines[key] = self.lines.get(key, 0) + quantity
+        self._save()
+        return True
+
+    def set_quantity(self, product_id, quantity):
+        key = str(product_id)
+        if key not in self.lines:
+            return False
+        if quantity > 0:
+            self.lines[key] = quantity
+        else:
+            del self.lines[key]
+        self._save()
+        return True
+
+    def remove(self, product_id):
+        return self.set_quantity(product_id, 0)
+
+    def clear(self):
+        self.lines = {}
+        self._save()
+
+    def items(self):
+        if not self.lines:
+            return []
+        products = Product.objects.in_bulk([int(pk) for pk in self.lines])
+        return [
+            GuestCartItem(products[int(pk)], quantity)
+            for pk, quantity in self.lines.items()
+            if int(pk) in products
+        ]
+
+    def summary(self):
+        items = self.items()
+        return CartSummary(items, sum((item.line_total for item in items), Decimal('0.00')),
+                           sum(item.quantity for item in items))
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    # Async views must not touch the session or the ORM synchronously
+    @classmethod
+    async def aload(cls, request):
+        cart = cls.__new__(cls)
+        cart.session = request.session
+        cart.lines = dict(await request.session.aget(SESSION_KEY, {}))
+        return cart
+
+    async def asummary(self):
+        products = await Product.objects.ain_bulk([int(pk) for pk in self.lines]) if self.lines else {}
+        items = [
+            GuestCartItem(products[int(pk)], quantity)
+            for pk, quantity in self.lines.items()
+            if int(pk) in products
+        ]
+        return CartSummary(items, sum((item.line_total for item in items), Decimal('0.00')),
+                           sum(item.quantity for item in items))
+
+
+def merge_guest_cart(request, user):
+    """Fold the session cart into the user's Cart, adding up quantities"""
+    guest_cart = GuestCart(request)
+    if not guest_cart:
+        return
+    quantities = {int(pk): quantity for pk, quantity in guest_cart.lines.items()}
+    product_ids = Product.objects.filter(id__in=quantities).values_list('id', flat=True)
+
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        update_cart_lines(cart, {product_id: quantities[product_id] for product_id in product_ids})
+    guest_cart.clear()
@@ -0,0 +1,160 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps, features
+
+from .cache import bump_version, fragment_cache, fragment_timeout
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Rendition formats, best compression first; JPEG is the fallback every browser reads
+FORMATS = [fmt for fmt in ('avif', 'webp') if features.check(fmt)] + ['jpeg']
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+SAVE_OPTIONS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 75, 'method': 4},
+    'jpeg': {'quality': 80, 'optimize': True, 'progressive': True},
+}
+
+
+def widths():
+    return sorted(getattr(settings, 'STORE_IMAGE_WIDTHS', [160, 320, 640]))
+
+
+def derivative_name(name, width, fmt):
+    stem = os.path.splitext(name)[0]
+    return f'derivatives/{stem}-{width}w.{"jpg" if fmt == "jpeg" else fmt}'
+
+
+def derivatives_ready(name):
+    # The largest JPEG is written last, so its presence means the set is complete
+    return default_storage.exists(derivative_name(name, widths()[-1], 'jpeg'))
+
+
+def _ready_key(name):
+    return f'store:renditions:{name}'
+
+
+def generate_derivatives(name):
+    """Write every width x format rendition of a stored image"""
+    with default_storage.open(name) as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in original.info else 'RGB')
+
+    for fmt in FORMATS:
+        for width in widths():
+            image = original.copy()
+            # Never upscale, small originals just get re-encoded
+            image.thumbnail((width, width * 4))
+            if fmt == 'jpeg' and image.mode == 'RGBA':
+                image = image.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+            target = derivative_name(name, width, fmt)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+
+
+class DerivativeQueue:
+    """
+    Runs image jobs off the request path on a small thread pool - by default
+    generating renditions. With STORE_IMAGE_WORKERS = 0 the work runs inline
+    (tests, scripts). The same image is never queued twice at once, and one
+    whose job failed is not queued again for STORE_IMAGE_RETRY_SECONDS.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._pending = set()
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def _run(self, name, callback, job, pooled=False):
+        try:
+            job(name)
+            if callback:
+                callback()
+        except Exception:
+            logger.exception('Could not process image %s', name)
+            with self._lock:
+                self._failed[name] = time.monotonic()
+        finally:
+            with self._lock:
+                self._pending.discard(name)
+            if pooled:
+                # Jobs may touch the database; pool threads live on, their connections should not
+                connections.close_all()
+
+    def schedule(self, name, callback=None, job=generate_derivatives):
+        with self._lock:
+            if name in self._pending:
+                return
+            failed_at = self._failed.get(name)
+            if failed_at is not None:
+                if time.monotonic() - failed_at < getattr(settings, 'STORE_IMAGE_RETRY_SECONDS', 600):
+                    return
+                del self._failed[name]
+            self._pending.add(name)
+        workers = getattr(settings, 'STORE_IMAGE_WORKERS', 2)
+        if not workers:
+            self._run(name, callback, job)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='derivatives')
+        self._executor.submit(self._run, name, callback, job, True)
+
+
+derivative_queue = DerivativeQueue()
+
+
+def delete_image(name):
+    """Remove a stored image along with its renditions"""
+    for target in [name] + [derivative_name(name, w, fmt) for fmt in FORMATS for w in widths()]:
+        default_storage.delete(target)
+    fragment_cache().delete(_ready_key(name))
+
+
+def renditions_ready(instance):
+    """Product cards are cached, so re-render them once the renditions exist"""
+    if isinstance(instance, Product):
+        bump_version('product', instance.id)
+        bump_version('products')
+        bump_version('category', instance.category_id)
+
+
+def schedule_renditions(image):
+    instance = image.instance
+    derivative_queue.schedule(image.name, callback=lambda: renditions_ready(instance))
+
+
+def renditions(image):
+    """
+    {format: srcset} for a stored image, or None while its renditions are
+    still being generated (generation is queued on the first miss). Once
+    they exist that is remembered in the fragment cache, so renders stop
+    asking storage.
+    """
+    if not image or not image.name:
+        return None
+    cache = fragment_cache()
+    if not cache.get(_ready_key(image.name)):
+        if not derivatives_ready(image.name):
+            schedule_renditions(image)
+            return None
+        cache.set(_ready_key(image.name), True, timeout=fragment_timeout())
+    return {
+        fmt: ', '.join(f'{default_storage.url(derivative_name(image.name, w, fmt))} {w}w' for w in widths())
+        for fmt in FORMATS
+    }
@@ -0,0 +1,175 @@
+import contextvars
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.template.backends.django import Template as DjangoTemplate
+
+from .cache import cache_stats
+
+# Upper bounds (seconds) of the request duration histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Distinct statements tracked per request for duplicate detection
+MAX_TRACKED_QUERIES = 1000
+
+_current = contextvars.ContextVar('store_request_stats', default=None)
+
+
+class RequestStats:
+    """What one request spent, filled in by the query hook and the template hook"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.statements = Counter()
+
+    def record(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            key = (sql, repr(params))
+            if key in self.statements or len(self.statements) < MAX_TRACKED_QUERIES:
+                self.statements[key] += 1
+
+    @property
+    def duplicates(self):
+        """Queries that repeated an earlier one in the same request, same SQL and params"""
+        return sum(count - 1 for count in self.statements.values())
+
+    def top_duplicates(self, limit=3):
+        return [(sql, count) for (sql, _), count in self.statements.most_common(limit) if count > 1]
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+# Query time - a permanent execute wrapper on each connection that reports to
+# the current request's stats. Connections are per thread, so the middleware
+# hooks the ones of the thread that runs the request's queries; for async
+# views that is the worker thread the ORM calls are sent to.
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats.record(execute, sql, params, many, context)
+
+
+def hook_connections():
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if record_query not in wrappers:
+            wrappers.append(record_query)
+
+
+# Template time - the Django backend's Template.render wrapped once per process.
+# Nested renders (includes, render_to_string inside a render) count once.
+def _timed_render(render):
+    def wrapper(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None or stats.rendering:
+            return render(self, context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.rendering = False
+    wrapper.store_instrumented = True
+    return wrapper
+
+
+def instrument_templates():
+    if not getattr(DjangoTemplate.render, 'store_instrumented', False):
+        DjangoTemplate.render = _timed_render(DjangoTemplate.render)
+
+
+class Metrics:
+    """Per-view totals for this process, exported in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._views = defaultdict(lambda: {
+            'count': 0, 'wall': 0.0, 'db': 0.0, 'template': 0.0, 'queries': 0,
+            'duplicates': 0, 'errors': 0, 'buckets': [0] * len(BUCKETS),
+        })
+
+    def record(self, view, wall, stats, status):
+        with self._lock:
+            totals = self._views[view]
+            totals['count'] += 1
+            totals['wall'] += wall
+            totals['db'] += stats.db_time
+            totals['template'] += stats.template_time
+            totals['queries'] += stats.queries
+            totals['duplicates'] += stats.duplicates
+            totals['errors'] += status >= 500
+            for i, bound in enumerate(BUCKETS):
+                if wall <= bound:
+                    totals['buckets'][i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {view: {**totals, 'buckets': list(totals['buckets'])} for view, totals in self._views.items()}
+
+    def render(self):
+        views = sorted(self.snapshot().items())
+        lines = [
+            '# HELP store_request_duration_seconds Wall time per request, by URL name.',
+            '# TYPE store_request_duration_seconds histogram',
+        ]
+        for view, totals in views:
+            for bound, count in zip(BUCKETS, totals['buckets']):
+                lines.append(f'store_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {count}')
+            lines.append(f'store_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {totals["count"]}')
+            lines.append(f'store_request_duration_seconds_sum{{view="{view}"}} {totals["wall"]:.6f}')
+            lines.append(f'store_request_duration_seconds_count{{view="{view}"}} {totals["count"]}')
+
+        counters = [
+            ('store_db_duration_seconds_total', 'Time spent in SQL.', 'db', '{:.6f}'),
+            ('store_db_queries_total', 'SQL queries issued.', 'queries', '{}'),
+            ('store_db_duplicate_queries_total', 'Queries repeating an earlier identical one in the same request.',
+             'duplicates', '{}'),
+            ('store_template_duration_seconds_total', 'Time spent rendering templates.', 'template', '{:.6f}'),
+            ('store_request_errors_total', 'Responses with a 5xx status.', 'errors', '{}'),
+        ]
+        for name, help_text, key, fmt in counters:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines += [f'{name}{{view="{view}"}} {fmt.format(totals[key])}' for view, totals in views]
+
+        lines += ['# HELP store_fragment_cache_requests_total Fragment cache lookups by result.',
+                  '# TYPE store_fragment_cache_requests_total counter']
+        for kind, counts in sorted(cache_stats.snapshot().items()):
+            lines.append(f'store_fragment_cache_requests_total{{kind="{kind}",result="hit"}} {counts["hits"]}')
+            lines.append(f'store_fragment_cache_requests_total{{kind="{kind}",result="miss"}} {counts["misses"]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; only answers the addresses in STORE_METRICS_ALLOWED_IPS"""
+    if not getattr(settings, 'STORE_INSTRUMENTATION', False):
+        raise Http404('Instrumentation is off')
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'STORE_METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
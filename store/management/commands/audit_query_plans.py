@@ -0,0 +1,113 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.urls import reverse
+
+from store.benchmarking import scratch_database, seed_catalog, seed_shopper
+from store.models import Category, Order, Product
+from store.pagination import paginate_products
+from store.search import get_search_backend, indexable_rows
+
+# A plan line that reads every row of a table
+FULL_SCAN = {
+    'sqlite': re.compile(r'^SCAN (\w+)$'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+
+def store_pages():
+    """(name, url, needs login) for every page a shopper can reach"""
+    product = Product.objects.order_by('id').first()
+    category = Category.objects.order_by('id').first()
+    order = Order.objects.order_by('id').first()
+    return [
+        ('home', reverse('home'), False),
+        ('home_next_page', reverse('home') + '?cursor=' + _second_page_cursor(), False),
+        ('products_by_category', reverse('products_by_category', args=[category.id]), False),
+        ('search_products', reverse('search_products') + '?q=shirt', False),
+        ('product_detail', reverse('product_detail', args=[product.id]), False),
+        ('cart_view', reverse('cart_view'), True),
+        ('checkout', reverse('checkout'), True),
+        ('order_history', reverse('order_history'), True),
+        ('order_detail', reverse('order_detail', args=[order.id]), True),
+        ('order_confirmation', reverse('order_confirmation', args=[order.id]), True),
+        ('track_order', reverse('track_order', args=[order.id]), True),
+        ('profile', reverse('profile'), True),
+    ]
+
+
+def _second_page_cursor():
+    return paginate_products(Product.objects.all()).next_cursor or ''
+
+
+class Command(BaseCommand):
+    help = ('Request every store page on a seeded scratch database, EXPLAIN each SELECT '
+            'it issues and flag full table scans')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--products', type=int, default=20_000)
+        parser.add_argument('--allow', nargs='*', default=['store_category'],
+                            help='Tables that are read whole on purpose (small and cached)')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error if any page does a full table scan')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        vendor = connections[alias].vendor
+        if vendor not in EXPLAIN:
+            raise CommandError(f'No EXPLAIN support for {vendor}')
+
+        with scratch_database(alias):
+            seed_catalog(options['products'])
+            user = seed_shopper()
+            get_search_backend().rebuild(indexable_rows(Product.objects.all()))
+            if vendor == 'postgresql':
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            flagged = self.audit(alias, vendor, user, set(options['allow']))
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f'{flagged} queries do full table scans')
+
+    def audit(self, alias, vendor, user, allowed):
+        connection = connections[alias]
+        client = Client()
+        flagged = 0
+        for name, url, needs_login in store_pages():
+            if needs_login:
+                client.force_login(user)
+            else:
+                client.logout()
+
+            selects = []
+
+            def capture(execute, sql, params, many, context):
+                if sql.lstrip().upper().startswith('SELECT'):
+                    selects.append((sql, params))
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(capture):
+                status = client.get(url).status_code
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name} [{status}] {len(selects)} selects'))
+
+            for sql, params in selects:
+                with connection.cursor() as cursor:
+                    cursor.execute(EXPLAIN[vendor] + sql, params)
+                    # The plan text is the last column on both SQLite and PostgreSQL
+                    plan = [str(row[-1]).strip() for row in cursor.fetchall()]
+                scans = [line for line in plan
+                         if (match := FULL_SCAN[vendor].search(line)) and match.group(1) not in allowed]
+                if scans:
+                    flagged += 1
+                    self.stdout.write(self.style.WARNING(f'  SCAN  {sql[:150]}'))
+                    for line in scans:
+                        self.stdout.write(f'        {line}')
+        self.stdout.write(f'{flagged} queries with full table scans')
+        return flagged
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import random
+import tempfile
+import threading
+import time
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from store.benchmarking import (WORDS, add_report_arguments, run_metadata, scratch_database, seed_store,
+                                summarize, write_report)
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = ('Throughput of the catalog and cart pages through the WSGI handler (sync views, a pool '
+            'of worker threads) against the ASGI handler (async views, many requests in flight on '
+            'one event loop), in process on a seeded scratch database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=8, help='WSGI worker threads')
+        parser.add_argument('--concurrency', type=int, default=100, help='ASGI requests in flight')
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        add_report_arguments(parser)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Worker threads need a shared file, not SQLite's per-connection memory database
+            name = os.path.join(tmp, 'asgi.sqlite3')
+            with scratch_database(options['database'], name=name):
+                seed_store(products=options['products'], users=0, orders=0, carts=0, seed=options['seed'])
+                paths = self.paths(options)
+                with override_settings(ROOT_URLCONF='ecommerce.urls'):
+                    wsgi = self.run_wsgi(paths, options['workers'])
+                with override_settings(ROOT_URLCONF='ecommerce.asgi_urls'):
+                    asgi = asyncio.run(self.run_asgi(paths, options['concurrency']))
+        run = {
+            'meta': run_metadata(benchmark='asgi', requests=options['requests'], workers=options['workers'],
+                                 concurrency=options['concurrency'], products=options['products']),
+            'results': {'wsgi': wsgi, 'asgi': asgi},
+        }
+        write_report(self, run, options, columns=('requests_per_second', 'errors', 'p50_ms', 'p95_ms'))
+
+    def paths(self, options):
+        """The same shuffled mix of home, product, search and cart pages for both runs"""
+        rng = random.Random(options['seed'])
+        product_ids = list(Product.objects.values_list('id', flat=True)[:1000])
+        pages = [
+            lambda: reverse('home'),
+            lambda: reverse('product_detail', args=[rng.choice(product_ids)]),
+            lambda: reverse('search_products') + f'?q={rng.choice(WORDS)}',
+            lambda: reverse('cart_view'),
+        ]
+        return [rng.choice(pages)() for _ in range(options['requests'])]
+
+    def result(self, timings, errors, elapsed):
+        return {'requests': len(timings), 'errors': errors, 'seconds': round(elapsed, 3),
+                'requests_per_second': round(len(timings) / elapsed, 1), **summarize(timings)}
+
+    def run_wsgi(self, paths, workers):
+        queue = iter(paths)
+        lock = threading.Lock()
+        timings, errors = [], [0]
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    with lock:
+                        path = next(queue, None)
+                    if path is None:
+                        return
+                    started = time.perf_counter()
+                    status = client.get(path).status_code
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        timings.append(elapsed)
+                        errors[0] += status != 200
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.result(timings, errors[0], time.perf_counter() - started)
+
+    async def run_asgi(self, paths, concurrency):
+        slots = asyncio.Semaphore(concurrency)
+        timings, errors = [], [0]
+
+        async def fetch(client, path):
+            # ASGIHandler gives each request its own thread for sync work, the test client does not
+            async with slots, ThreadSensitiveContext():
+                started = time.perf_counter()
+                status = (await client.get(path)).status_code
+                timings.append((time.perf_counter() - started) * 1000)
+                errors[0] += status != 200
+                # That thread's connection ends with the request (CONN_MAX_AGE=0 under ASGI)
+                await sync_to_async(connections.close_all)()
+
+        clients = [AsyncClient() for _ in range(concurrency)]
+        started = time.perf_counter()
+        await asyncio.gather(*(fetch(clients[i % concurrency], path) for i, path in enumerate(paths)))
+        return self.result(timings, errors[0], time.perf_counter() - started)
@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from store.benchmarking import scratch_database
+from store.models import Cart, CartItem, Category, Order, Product
+from store.services import OutOfStockError, place_order
+
+
+class Command(BaseCommand):
+    help = ('Contention benchmark: many threads checking out the same hot product. '
+            'Runs on a scratch copy of --database (SQLite file or PostgreSQL).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--buyers', type=int, default=400)
+        parser.add_argument('--stock', type=int, default=250)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        vendor = connections[alias].vendor
+        with tempfile.TemporaryDirectory() as tmp:
+            # Threads need a shared file, not SQLite's per-connection memory database
+            name = os.path.join(tmp, 'checkout.sqlite3') if vendor == 'sqlite' else None
+            with scratch_database(alias, name=name):
+                result = self.run_benchmark(options)
+        result.update(vendor=vendor, threads=options['threads'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            for key, value in result.items():
+                self.stdout.write(f'{key:>16}: {value}')
+        if result['oversold']:
+            self.stderr.write(self.style.ERROR('Stock went negative or orders exceed stock'))
+
+    def setup_buyers(self, buyers, stock):
+        category = Category.objects.create(name='Hot deals')
+        product = Product.objects.create(name='Hot SKU', description='', price=Decimal('499.00'),
+                                         category=category, stock=stock)
+        User.objects.bulk_create([User(username=f'buyer{i}') for i in range(buyers)])
+        users = list(User.objects.filter(username__startswith='buyer'))
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product) for cart in carts])
+        return product, list(zip(users, carts))
+
+    def run_benchmark(self, options):
+        product, buyers = self.setup_buyers(options['buyers'], options['stock'])
+        counts = {'placed': 0, 'out_of_stock': 0, 'errors': 0}
+        lock = threading.Lock()
+        queue = iter(buyers)
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        buyer = next(queue, None)
+                    if buyer is None:
+                        return
+                    try:
+                        place_order(*buyer)
+                        outcome = 'placed'
+                    except OutOfStockError:
+                        outcome = 'out_of_stock'
+                    except OperationalError:
+                        outcome = 'errors'
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        product.refresh_from_db()
+        orders = Order.objects.count()
+        return {
+            **counts,
+            'final_stock': product.stock,
+            'orders': orders,
+            'oversold': product.stock < 0 or orders > options['stock'],
+            'seconds': round(elapsed, 3),
+            'checkouts_per_second': round(len(buyers) / elapsed, 1),
+        }
@@ -0,0 +1,40 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from store.benchmarking import measure, scratch_database, seed_catalog
+from store.models import Product
+from store.search import FTS5SearchBackend, IContainsSearchBackend, indexable_rows
+
+QUERIES = ['shirt', 'wireless head', 'steel bottle', 'org tea', 'laptop stand desk', 'unobtainium']
+
+
+class Command(BaseCommand):
+    help = 'Compare search latency of the FTS5 index with name__icontains on a scratch database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        results = []
+        with scratch_database(), tempfile.TemporaryDirectory() as tmp:
+            fts = FTS5SearchBackend(os.path.join(tmp, 'index.sqlite3'))
+            icontains = IContainsSearchBackend()
+            for size in sorted(options['sizes']):
+                seed_catalog(size)
+                fts.rebuild(indexable_rows(Product.objects.order_by('id')))
+                for name, backend in [('icontains', icontains), ('fts5', fts)]:
+                    for query in QUERIES:
+                        stats = measure(lambda: backend.search(query, 24), options['repeat'])
+                        results.append({'products': size, 'backend': name, 'query': query, **stats})
+                        if not options['json']:
+                            self.stdout.write(
+                                f"{size:>9} {name:<10} {query!r:<22} "
+                                f"p50={stats['p50_ms']:.2f}ms p95={stats['p95_ms']:.2f}ms"
+                            )
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
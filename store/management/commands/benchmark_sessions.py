@@ -0,0 +1,61 @@
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from store.benchmarking import add_report_arguments, measure, run_metadata, scratch_database, seed_store, write_report
+from store.models import Product
+
+ENGINES = ['db', 'cached_db', 'signed_cookies']
+
+
+class Command(BaseCommand):
+    help = ('Queries and session-table queries of the anonymous browse path (browse, add to cart, '
+            'keep browsing) under each session engine, on a seeded scratch database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--engine', action='append', choices=ENGINES, help='Only these engines (repeatable)')
+        add_report_arguments(parser)
+
+    def handle(self, *args, **options):
+        results = {}
+        with scratch_database(options['database']):
+            seed_store(products=options['products'], users=0, orders=0, carts=0)
+            product = Product.objects.order_by('id').first()
+            for engine in options['engine'] or ENGINES:
+                with override_settings(SESSION_ENGINE=f'django.contrib.sessions.backends.{engine}'):
+                    for step, result in self.browse(product, options['repeat']):
+                        results[f'{engine}:{step}'] = result
+        run = {'meta': run_metadata(benchmark='sessions', products=options['products'], repeat=options['repeat']),
+               'results': results}
+        write_report(self, run, options, columns=('queries', 'session_sql', 'p50_ms'))
+
+    def browse(self, product, repeat):
+        """A visitor without a session browses, adds one product, then browses with the session"""
+        client = Client()
+        steps = [
+            ('home', 'get', reverse('home')),
+            ('product', 'get', reverse('product_detail', args=[product.id])),
+            ('add_to_cart', 'post', reverse('add_to_cart', args=[product.id])),
+            ('home_2', 'get', reverse('home')),
+            ('product_2', 'get', reverse('product_detail', args=[product.id])),
+            ('cart', 'get', reverse('cart_view')),
+        ]
+        for name, method, path in steps:
+            if method == 'get':
+                # Page caches are warm in a real visit; count the session's share only
+                client.get(path)
+            with ExitStack() as stack:
+                captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                getattr(client, method)(path)
+            queries = [query['sql'] for capture in captured for query in capture.captured_queries]
+            # add_to_cart is timed once, repeating it would only grow the cart
+            timing = measure(lambda: getattr(client, method)(path), repeat=1 if method == 'post' else repeat)
+            yield name, {'queries': len(queries),
+                         'session_sql': sum('django_session' in sql for sql in queries), **timing}
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from store.benchmarking import scratch_database, seed_catalog
+from store.models import Cart, CartItem, Product
+from store.sqlite import TUNED_PRAGMAS, current_pragmas
+
+
+# name: (OPTIONS, pragmas, write queue)
+PROFILES = {
+    'plain': ({}, {}, False),
+    'tuned': ({'transaction_mode': 'IMMEDIATE'}, TUNED_PRAGMAS, False),
+    'tuned+queue': ({'transaction_mode': 'IMMEDIATE'}, TUNED_PRAGMAS, True),
+}
+
+
+class Command(BaseCommand):
+    help = ('Cart write throughput on SQLite: N threads adding to their carts through the '
+            'views, once per tuning profile (plain, tuned, tuned+queue), each on a scratch file.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100, help='Cart writes per thread')
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--profile', action='append', choices=sorted(PROFILES),
+                            help='Profile to run, repeatable (default: all)')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if connections[alias].vendor != 'sqlite':
+            raise CommandError('This benchmark compares SQLite settings, --database must be SQLite')
+
+        results = []
+        # Failed requests are counted, not logged one by one
+        request_logger = logging.getLogger('django.request')
+        old_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            for profile in options['profile'] or list(PROFILES):
+                with tempfile.TemporaryDirectory() as tmp, self.sqlite_profile(alias, profile):
+                    with scratch_database(alias, name=os.path.join(tmp, 'writes.sqlite3')):
+                        result = self.run_benchmark(alias, options)
+                results.append({'profile': profile, **result})
+        finally:
+            request_logger.setLevel(old_level)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(self.style.MIGRATE_HEADING(result.pop('profile')))
+            for key, value in result.items():
+                self.stdout.write(f'{key:>20}: {value}')
+
+    @contextmanager
+    def sqlite_profile(self, alias, profile):
+        db_options, pragmas, queue = PROFILES[profile]
+        settings_dict = connections[alias].settings_dict
+        old_options = settings_dict.get('OPTIONS', {})
+        # Every thread opens its own connection from this same settings dict
+        connections[alias].close()
+        settings_dict['OPTIONS'] = {**old_options, **db_options}
+        if not db_options:
+            settings_dict['OPTIONS'].pop('transaction_mode', None)
+        try:
+            with override_settings(STORE_SQLITE_PRAGMAS=pragmas, STORE_SQLITE_WRITE_QUEUE=queue):
+                yield
+        finally:
+            connections[alias].close()
+            settings_dict['OPTIONS'] = old_options
+
+    def setup_clients(self, threads, products):
+        seed_catalog(products, categories=5)
+        Product.objects.update(stock=1_000_000)
+        User.objects.bulk_create([User(username=f'writer{i}') for i in range(threads)])
+        users = list(User.objects.filter(username__startswith='writer').order_by('id'))
+        Cart.objects.bulk_create([Cart(user=user) for user in users])
+        clients = []
+        for user in users:
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            clients.append(client)
+        return clients, list(Product.objects.values_list('id', flat=True))
+
+    def run_benchmark(self, alias, options):
+        clients, product_ids = self.setup_clients(options['threads'], options['products'])
+        pragmas = current_pragmas(alias)
+        counts = {'ok': 0, 'errors': 0}
+        timings = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(clients))
+
+        def worker(index, client):
+            ok = errors = 0
+            latencies = []
+            urls = [reverse('add_to_cart', args=[product_ids[(index * 7 + i) % len(product_ids)]])
+                    for i in range(options['requests'])]
+            barrier.wait()
+            try:
+                for url in urls:
+                    started = time.perf_counter()
+                    response = client.post(url)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if response.status_code == 302:
+                        ok += 1
+                    else:
+                        errors += 1
+            finally:
+                connections.close_all()
+            with lock:
+                counts['ok'] += ok
+                counts['errors'] += errors
+                timings.extend(latencies)
+
+        threads = [threading.Thread(target=worker, args=(i, client)) for i, client in enumerate(clients)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        return {
+            **counts,
+            'saved_quantity': sum(CartItem.objects.values_list('quantity', flat=True)),
+            'threads': len(clients),
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(counts['ok'] / elapsed, 1),
+            'p50_ms': round(timings[len(timings) // 2], 2) if timings else None,
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2) if timings else None,
+            'journal_mode': pragmas['journal_mode'],
+            'synchronous': pragmas['synchronous'],
+        }
@@ -0,0 +1,132 @@
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from store.benchmarking import (add_report_arguments, run_metadata, scratch_database, seed_shopper,
+                                seed_store, summarize, write_report)
+from store.models import CartItem, Category, Order, Product
+
+ADDRESS = {
+    'full_name': 'Bench Shopper', 'street_address': '1 Test Street', 'city': 'Pune',
+    'state': 'MH', 'postal_code': '411001', 'phone': '9999999999', 'payment_method': 'cod',
+}
+
+
+class Command(BaseCommand):
+    help = ('Latency and query count of every store URL through the test client, '
+            'on a seeded scratch database. Save with --output, diff against a saved run with --compare.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--carts', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--view', action='append', help='Only run these views (repeatable)')
+        add_report_arguments(parser)
+
+    def handle(self, *args, **options):
+        sizes = {key: options[key] for key in ('categories', 'products', 'users', 'orders', 'carts')}
+        with scratch_database(options['database']):
+            seed_store(**sizes, seed=options['seed'])
+            fixtures = self.fixtures()
+            results = {}
+            for scenario in self.scenarios(fixtures):
+                if options['view'] and scenario['name'] not in options['view']:
+                    continue
+                results[scenario['name']] = self.profile(scenario, fixtures, options['repeat'])
+        run = {'meta': run_metadata(benchmark='views', repeat=options['repeat'], seed=options['seed'], **sizes),
+               'results': results}
+        write_report(self, run, options, columns=('status', 'p50_ms', 'p95_ms', 'queries', 'cold_queries'))
+
+    def fixtures(self):
+        shopper = seed_shopper('bench-shopper', orders=3, cart_lines=3)
+        anonymous, signed_in = Client(), Client()
+        signed_in.force_login(shopper)
+        product = Product.objects.filter(stock__gt=0).order_by('id').first()
+        Product.objects.filter(id=product.id).update(stock=1_000_000)
+        return {
+            'shopper': shopper,
+            'anonymous': anonymous,
+            'signed_in': signed_in,
+            'product': product,
+            'category': Category.objects.order_by('id').first(),
+            'order': Order.objects.filter(user=shopper).latest('created_at'),
+            'next_cursor': anonymous.get(reverse('home'), {'format': 'json'}).json()['next_cursor'],
+        }
+
+    def scenarios(self, f):
+        """Every URL in store.urls plus login; paths may be callables run untimed before each request"""
+        product, order, cart = f['product'], f['order'], f['shopper'].cart_set.get()
+
+        def cart_line():
+            item, _ = CartItem.objects.get_or_create(cart=cart, product=product)
+            return item
+
+        def fill_cart(path):
+            def prepare():
+                cart_line()
+                return path
+            return prepare
+
+        return [
+            {'name': 'home', 'path': reverse('home')},
+            {'name': 'home_json', 'path': reverse('home') + '?format=json'},
+            {'name': 'home_next_page', 'path': reverse('home') + f"?cursor={f['next_cursor']}"},
+            {'name': 'product_detail', 'path': reverse('product_detail', args=[product.id])},
+            {'name': 'products_by_category', 'path': reverse('products_by_category', args=[f['category'].id])},
+            {'name': 'search_products', 'path': reverse('search_products') + '?q=cotton+shirt'},
+            {'name': 'search_suggest', 'path': reverse('search_suggest') + '?q=sh'},
+            {'name': 'signup', 'path': reverse('signup')},
+            {'name': 'login', 'path': reverse('login')},
+            {'name': 'home_signed_in', 'path': reverse('home'), 'user': True},
+            {'name': 'profile', 'path': reverse('profile'), 'user': True},
+            {'name': 'edit_profile', 'path': reverse('edit_profile'), 'user': True},
+            {'name': 'upload_photo', 'path': reverse('upload_photo'), 'user': True},
+            {'name': 'cart_view', 'path': reverse('cart_view'), 'user': True},
+            {'name': 'add_to_cart', 'method': 'post', 'user': True,
+             'path': reverse('add_to_cart', args=[product.id])},
+            {'name': 'update_cart_quantity', 'method': 'post', 'user': True, 'data': {'quantity': 2},
+             'path': lambda: reverse('update_cart_quantity', args=[cart_line().id])},
+            {'name': 'remove_from_cart', 'method': 'post', 'user': True,
+             'path': lambda: reverse('remove_from_cart', args=[cart_line().id])},
+            {'name': 'checkout', 'path': fill_cart(reverse('checkout')), 'user': True},
+            {'name': 'checkout_submit', 'method': 'post', 'user': True, 'data': ADDRESS,
+             'path': fill_cart(reverse('checkout'))},
+            {'name': 'order_confirmation', 'path': reverse('order_confirmation', args=[order.id]), 'user': True},
+            {'name': 'order_history', 'path': reverse('order_history'), 'user': True},
+            {'name': 'order_detail', 'path': reverse('order_detail', args=[order.id]), 'user': True},
+            {'name': 'track_order', 'path': reverse('track_order', args=[order.id]), 'user': True},
+        ]
+
+    def profile(self, scenario, fixtures, repeat):
+        client = fixtures['signed_in' if scenario.get('user') else 'anonymous']
+        send = getattr(client, scenario.get('method', 'get'))
+        path = scenario['path']
+
+        def call():
+            url = path() if callable(path) else path
+            with ExitStack() as stack:
+                captured = [stack.enter_context(CaptureQueriesContext(connections[alias]))
+                            for alias in connections]
+                started = time.perf_counter()
+                response = send(url, scenario.get('data'))
+                elapsed = (time.perf_counter() - started) * 1000
+            return response.status_code, elapsed, sum(len(queries) for queries in captured)
+
+        # The first call fills caches; it is reported separately as cold_queries
+        status, _, cold_queries = call()
+        timings, queries = [], []
+        for _ in range(repeat):
+            _, elapsed, count = call()
+            timings.append(elapsed)
+            queries.append(count)
+        return {'status': status, **summarize(timings), 'queries': max(queries), 'cold_queries': cold_queries}
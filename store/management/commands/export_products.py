@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import FORMATS, export_rows, guess_format, write_rows
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Export products to a CSV or JSON Lines file (- for stdout) that import_products reads back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--category', type=int, help='Only this category id')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        products = Product.objects.all()
+        if options['category']:
+            products = products.filter(category_id=options['category'])
+        try:
+            stream = sys.stdout if options['path'] == '-' else open(options['path'], 'w', newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        try:
+            write_rows(stream, export_rows(products), fmt)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
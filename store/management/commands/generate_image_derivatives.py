@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from store.images import derivatives_ready, generate_derivatives
+from store.models import Product, UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive renditions for product images and profile pictures that lack them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--force', action='store_true', help='Regenerate existing renditions too')
+
+    def handle(self, *args, **options):
+        names = set(Product.objects.exclude(image='').values_list('image', flat=True))
+        names |= set(UserProfile.objects.exclude(profile_picture='').exclude(profile_picture=None)
+                     .values_list('profile_picture', flat=True))
+        todo = sorted(name for name in names if options['force'] or not derivatives_ready(name))
+
+        def generate(name):
+            try:
+                generate_derivatives(name)
+                return True
+            except (OSError, ValueError) as e:
+                self.stderr.write(f'{name}: {e}')
+                return False
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            done = sum(pool.map(generate, todo))
+        self.stdout.write(self.style.SUCCESS(f'Generated renditions for {done} of {len(names)} images'))
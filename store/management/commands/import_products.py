@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import FORMATS, CatalogImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Import products from a CSV or JSON Lines file (- for stdin), creating new skus and '
+            'updating known ones in chunked bulk upserts. Missing categories are created.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per transaction')
+        parser.add_argument('--workers', type=int, default=8, help='Parallel image downloads')
+        parser.add_argument('--no-images', action='store_true', help='Ignore image_url columns')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        importer = CatalogImporter(batch_size=options['batch_size'], workers=options['workers'],
+                                   images=not options['no_images'])
+        started = time.perf_counter()
+
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stderr.write(f"{stats['rows']} rows, {time.perf_counter() - started:.1f}s")
+
+        try:
+            stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(e)
+        with stream:
+            stats = importer.run(read_rows(stream, fmt), progress=progress)
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['rows']} rows in {elapsed:.1f}s ({stats['rows'] / max(elapsed, 1e-9):.0f}/s): "
+            f"{stats['created']} created, {stats['updated']} updated, {stats['skipped']} skipped, "
+            f"{stats['images']} images downloaded"
+        ))
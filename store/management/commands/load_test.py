@@ -0,0 +1,195 @@
+import http.cookiejar
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from urllib.parse import urlencode
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.db import DEFAULT_DB_ALIAS
+from django.test.utils import override_settings
+
+from store.benchmarking import (PASSWORD, WORDS, add_report_arguments, run_metadata, scratch_database,
+                                seed_store, summarize, write_report)
+from store.models import Product
+
+from .benchmark_views import ADDRESS
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Each step is timed on its own, redirects are not followed
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class VirtualUser:
+    """One shopper with its own cookie jar, like a locust user"""
+
+    def __init__(self, base_url, username, record, rng):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.record = record
+        self.rng = rng
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def request(self, step, path, data=None, expect=(200,)):
+        headers = {}
+        body = None
+        if data is not None:
+            body = urlencode(data).encode()
+            headers['X-CSRFToken'] = self.csrf_token()
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, content = e.code, e.read()
+        except OSError:
+            status, content = 0, b''
+        self.record(step, (time.perf_counter() - started) * 1000, status in expect)
+        return status, content
+
+    def login(self):
+        self.request('login_form', '/accounts/login/')
+        status, _ = self.request('login', '/accounts/login/', {'username': self.username, 'password': PASSWORD},
+                                 expect=(302,))
+        return status == 302
+
+    def product_ids(self):
+        _, content = self.request('home_json', '/?format=json')
+        try:
+            return [item['id'] for item in json.loads(content)['results']]
+        except (ValueError, KeyError):
+            return []
+
+    def shop(self, product_ids):
+        """browse -> search -> add_to_cart -> checkout"""
+        product_id = self.rng.choice(product_ids)
+        self.request('home', '/')
+        self.request('product_detail', f'/product/{product_id}/')
+        self.request('search', '/search/?' + urlencode({'q': self.rng.choice(WORDS)}))
+        self.request('add_to_cart', f'/cart/add/{product_id}/', {}, expect=(302,))
+        self.request('cart', '/cart/')
+        self.request('checkout_form', '/checkout/')
+        status, _ = self.request('checkout', '/checkout/', ADDRESS, expect=(302,))
+        return status == 302
+
+
+class Command(BaseCommand):
+    help = ('Headless load test: virtual users log in, browse, search, add to cart and check out '
+            'concurrently over HTTP. Without --url a local server is started on a seeded scratch '
+            'database; with --url it drives a running server seeded by seed_store.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server (accounts user0..N from seed_store)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+        parser.add_argument('--iterations', type=int, default=5, help='Shopping trips per user')
+        parser.add_argument('--duration', type=float, help='Run for this many seconds instead of --iterations')
+        parser.add_argument('--think-ms', type=int, default=0, help='Pause between trips')
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        add_report_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options['url']:
+            run = self.run_load(options['url'], options)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                # Server threads need a shared file, not SQLite's per-connection memory database
+                name = os.path.join(tmp, 'load.sqlite3')
+                # A fast hasher keeps the logins at the start from dominating the run
+                local = override_settings(ALLOWED_HOSTS=['127.0.0.1', 'localhost'],
+                                          PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+                with scratch_database(options['database'], name=name), local:
+                    seed_store(categories=options['categories'], products=options['products'],
+                               users=options['users'], orders=0, carts=0, seed=options['seed'])
+                    Product.objects.update(stock=1_000_000)
+                    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler, allow_reuse_address=False)
+                    server.set_app(WSGIHandler())
+                    threading.Thread(target=server.serve_forever, daemon=True).start()
+                    try:
+                        run = self.run_load(f'http://127.0.0.1:{server.server_port}', options)
+                    finally:
+                        server.shutdown()
+                        server.server_close()
+        write_report(self, run, options, columns=('requests', 'failures', 'p50_ms', 'p95_ms'))
+        if options['json']:
+            return
+        totals = run['meta']['totals']
+        self.stdout.write(f"{totals['requests']} requests, {totals['failures']} failed, "
+                          f"{totals['requests_per_second']} req/s, {totals['checkouts']} checkouts")
+
+    def run_load(self, base_url, options):
+        timings = defaultdict(list)
+        failures = defaultdict(int)
+        checkouts = [0]
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration'] if options['duration'] else None
+
+        def record(step, elapsed, ok):
+            with lock:
+                timings[step].append(elapsed)
+                if not ok:
+                    failures[step] += 1
+
+        def run_user(index):
+            user = VirtualUser(base_url, f'user{index}', record, random.Random(options['seed'] + index))
+            if not user.login():
+                return
+            product_ids = user.product_ids()
+            if not product_ids:
+                return
+            trips = 0
+            while (time.monotonic() < deadline) if deadline else trips < options['iterations']:
+                if user.shop(product_ids):
+                    with lock:
+                        checkouts[0] += 1
+                trips += 1
+                if options['think_ms']:
+                    time.sleep(options['think_ms'] / 1000)
+
+        threads = [threading.Thread(target=run_user, args=(i,)) for i in range(options['users'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        requests = sum(len(values) for values in timings.values())
+        if not requests:
+            raise CommandError(f'No requests reached {base_url}')
+        results = {
+            step: {'requests': len(values), 'failures': failures[step], **summarize(values)}
+            for step, values in timings.items()
+        }
+        totals = {
+            'requests': requests,
+            'failures': sum(failures.values()),
+            'checkouts': checkouts[0],
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(requests / elapsed, 1),
+        }
+        meta = run_metadata(benchmark='load', url=options['url'] or 'local', users=options['users'],
+                            iterations=None if deadline else options['iterations'],
+                            duration=options['duration'], products=options['products'], totals=totals)
+        return {'meta': meta, 'results': results}
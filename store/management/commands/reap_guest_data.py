@@ -0,0 +1,38 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.reaper import reap_guest_carts, reap_sessions
+
+
+class Command(BaseCommand):
+    help = ('Delete abandoned guest carts and expired sessions in small batches with a pause '
+            'between them, so the job can run from cron next to live traffic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cart-days', type=int, default=getattr(settings, 'STORE_GUEST_CART_TTL_DAYS', 30),
+                            help='Guest carts untouched for this many days are abandoned')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.1, help='Seconds to pause after each batch')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches of each kind')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted')
+
+    def handle(self, *args, **options):
+        batching = {'batch_size': options['batch_size'], 'pause': options['sleep'],
+                    'dry_run': options['dry_run'], 'max_batches': options['max_batches']}
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        started = time.perf_counter()
+
+        carts = reap_guest_carts(timezone.now() - timedelta(days=options['cart_days']), **batching)
+        oldest = f", oldest untouched since {carts['oldest']:%Y-%m-%d}" if carts['oldest'] else ''
+        self.stdout.write(f"{verb} {carts['carts']} guest carts with {carts['items']} lines{oldest}")
+
+        sessions = reap_sessions(**batching)
+        if sessions is None:
+            self.stdout.write(f'Sessions are not stored in the database ({settings.SESSION_ENGINE}), skipped')
+        else:
+            self.stdout.write(f"{verb} {sessions['sessions']} expired sessions")
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
@@ -0,0 +1,23 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Recompute the daily sales rollups from orders: all of them (run once after '
+            'migrating), or from --since on to restate a range after bulk edits.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First day to recompute, YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date, YYYY-MM-DD')
+        written = rebuild(since=since)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} rollup rows'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store.models import Product
+from store.search import get_search_backend, indexable_rows
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product search index from the database'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild(indexable_rows(Product.objects.order_by('id')))
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {Product.objects.count()} products with {type(backend).__name__}'
+        ))
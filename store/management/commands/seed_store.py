@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from store.benchmarking import PASSWORD, seed_store
+
+
+class Command(BaseCommand):
+    help = ('Fill the configured database with a deterministic fake store for local load tests. '
+            'Adds to what is there; accounts are user0..N with a shared password.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=10_000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--carts', type=int, default=50)
+        parser.add_argument('--cart-lines', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic(using=options['database']):
+            counts = seed_store(
+                categories=options['categories'], products=options['products'], users=options['users'],
+                orders=options['orders'], carts=options['carts'], cart_lines=options['cart_lines'],
+                seed=options['seed'],
+            )
+        for key, value in counts.items():
+            self.stdout.write(f'{key:>12}: {value}')
+        self.stdout.write(f"Accounts user0..user{options['users'] - 1}, password {PASSWORD!r}")
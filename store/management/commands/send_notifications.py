@@ -0,0 +1,37 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from store.notifications import deliver_batch
+
+
+class Command(BaseCommand):
+    help = ('Deliver queued order notifications from the outbox in batches, retrying failures '
+            'with backoff. Runs until stopped; --once exits when nothing is due.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when nothing is due')
+        parser.add_argument('--once', action='store_true', help='Deliver what is due now, then exit')
+
+    def handle(self, *args, **options):
+        totals = Counter()
+        try:
+            while True:
+                results = deliver_batch(options['batch_size'])
+                if any(results.values()):
+                    totals.update(results)
+                    self.stdout.write(f"Sent {results['sent']}, retrying {results['retried']}, "
+                                      f"failed {results['failed']}")
+                    continue
+                if options['once']:
+                    break
+                # A long-lived worker must not hold on to a broken or expired connection
+                close_old_connections()
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['sent']} sent, {totals['retried']} to retry, {totals['failed']} failed"))
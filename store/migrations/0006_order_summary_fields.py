@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:07
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_order_summaries(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    totals = (OrderItem.objects.values('order_id')
+              .annotate(items=Sum('quantity'), lines=Count('id')))
+    for row in totals.iterator():
+        first = (OrderItem.objects.filter(order_id=row['order_id'])
+                 .order_by('id').values_list('product__image', flat=True).first())
+        Order.objects.filter(id=row['order_id']).update(
+            item_count=row['items'], line_count=row['lines'], thumbnail=first or '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_product_recent_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='line_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='products/'),
+        ),
+        migrations.RunPython(fill_order_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:08
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """Fold duplicate carts and cart lines together so the unique constraints can be added"""
+    Cart = apps.get_model('store', 'Cart')
+    CartItem = apps.get_model('store', 'CartItem')
+
+    duplicate_users = (Cart.objects.filter(user__isnull=False).values('user_id')
+                       .annotate(carts=Count('id'), keep=Min('id')).filter(carts__gt=1))
+    for row in duplicate_users:
+        extra = Cart.objects.filter(user_id=row['user_id']).exclude(id=row['keep'])
+        CartItem.objects.filter(cart__in=extra).update(cart_id=row['keep'])
+        extra.delete()
+
+    duplicate_lines = (CartItem.objects.values('cart_id', 'product_id')
+                       .annotate(lines=Count('id'), keep=Min('id'), total=Sum('quantity'))
+                       .filter(lines__gt=1))
+    for row in duplicate_lines:
+        CartItem.objects.filter(id=row['keep']).update(quantity=row['total'])
+        CartItem.objects.filter(cart_id=row['cart_id'], product_id=row['product_id']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_order_summary_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['session_key'], name='cart_guest_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='order_user_recent_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='unique_cart_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_product_per_cart'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_missing_profiles(apps, schema_editor):
+    """Profiles are now made with the account; give older accounts theirs"""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserProfile = apps.get_model('store', 'UserProfile')
+    missing = User.objects.filter(userprofile__isnull=True).values_list('id', flat=True)
+    UserProfile.objects.bulk_create([UserProfile(user_id=user_id) for user_id in missing.iterator()],
+                                    batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_cart_guest_updated_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_create_missing_profiles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='pending_picture',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:20
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """
+    Fold repeated (order, product) lines into the first one so the unique
+    constraint can be added. Quantities are summed and the price becomes the
+    average unit price, so the order's total is unchanged (to the paisa).
+    """
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+
+    duplicates = (OrderItem.objects.values('order_id', 'product_id')
+                  .annotate(lines=Count('id'), keep=Min('id'), quantity_sum=Sum('quantity'),
+                            value=Sum(F('quantity') * F('price'),
+                                      output_field=DecimalField(max_digits=14, decimal_places=2)))
+                  .filter(lines__gt=1))
+    orders = set()
+    for row in duplicates:
+        price = (Decimal(row['value']) / row['quantity_sum']).quantize(Decimal('0.01')) if row['quantity_sum'] else 0
+        OrderItem.objects.filter(id=row['keep']).update(quantity=row['quantity_sum'], price=price)
+        (OrderItem.objects.filter(order_id=row['order_id'], product_id=row['product_id'])
+         .exclude(id=row['keep']).delete())
+        orders.add(row['order_id'])
+    for order_id in orders:
+        Order.objects.filter(id=order_id).update(line_count=OrderItem.objects.filter(order_id=order_id).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='unique_product_per_order'),
+        ),
+    ]
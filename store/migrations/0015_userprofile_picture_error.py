@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_order_line_uniqueness'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='picture_error',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+    ]
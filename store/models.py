@@ -1,5 +1,10 @@
+import asyncio
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Category Model
 class Category(models.Model):
@@ -11,6 +16,8 @@ class Category(models.Model):
 
 # Product Model  
 class Product(models.Model):
+    # Stock keeping unit - the key bulk imports match rows on
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -19,27 +26,15 @@ class Product(models.Model):
     stock = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
-    def __str__(self):
-        return self.name
-
-# Order Model
-class Order(models.Model):
-    ORDER_STATUS = [
-        ('pending', 'Pending'),
-        ('processing', 'Processing'), 
-        ('shipped', 'Shipped'),
-        ('delivered', 'Delivered'),
-        ('cancelled', 'Cancelled'),
-    ]
-    
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    status = models.CharField(max_length=20, choices=ORDER_STATUS, default='pending')
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    class Meta:
+        # Keyset pagination walks these in (created_at, id) order
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_recent_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_recent_idx'),
+        ]
     
     def __str__(self):
-        return f"Order {self.id} - {self.user.username}"
+        return self.name
 
 # Address Model (NEW)
 class Address(models.Model):
@@ -55,7 +50,7 @@ class Address(models.Model):
     def __str__(self):
         return f"{self.full_name} - {self.city}"
 
-# Order Model ko UPDATE karo - ye fields ADD karo:
+# Order Model
 class Order(models.Model):
     ORDER_STATUS = [
         ('pending', 'Pending'),
@@ -76,6 +71,16 @@ class Order(models.Model):
     payment_method = models.CharField(max_length=50, default='card')
     payment_status = models.CharField(max_length=20, default='pending')
     
+    # Summary fields - filled in at order placement so listings never count OrderItems
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    line_count = models.PositiveIntegerField(default=0, editable=False)
+    thumbnail = models.ImageField(upload_to='products/', blank=True, editable=False)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_recent_idx'),
+        ]
+    
     def __str__(self):
         return f"Order {self.id} - {self.user.username}"
 
@@ -86,6 +91,12 @@ class OrderItem(models.Model):
     quantity = models.IntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     
+    class Meta:
+        constraints = [
+            # place_order writes one line per product; a second one would double count it
+            models.UniqueConstraint(fields=['order', 'product'], name='unique_product_per_order'),
+        ]
+    
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
@@ -96,10 +107,57 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='unique_cart_per_user'),
+        ]
+        indexes = [
+            # Legacy guest carts are looked up by (session_key, user=None)
+            models.Index(fields=['session_key'], condition=models.Q(user__isnull=True),
+                         name='cart_guest_session_idx'),
+            # The reaper walks abandoned guest carts oldest first
+            models.Index(fields=['updated_at'], condition=models.Q(user__isnull=True),
+                         name='cart_guest_updated_idx'),
+        ]
+    
     def __str__(self):
         if self.user:
             return f"Cart - {self.user.username}"
         return f"Cart - {self.session_key}"
+    
+    def summary(self):
+        """Lines with their products in one joined query, totals summed by the database"""
+        lines = self.cartitem_set.all()
+        items = list(lines.select_related('product').annotate(line_total=LINE_TOTAL).order_by('added_at', 'id'))
+        totals = lines.aggregate(subtotal=Sum(LINE_TOTAL), item_count=Sum('quantity'))
+        return CartSummary(items, totals['subtotal'] or Decimal('0.00'), totals['item_count'] or 0)
+    
+    async def asummary(self):
+        """summary() for async views - the lines and the totals queries run concurrently"""
+        lines = self.cartitem_set.all()
+        items_query = lines.select_related('product').annotate(line_total=LINE_TOTAL).order_by('added_at', 'id')
+        
+        async def fetch_items():
+            return [item async for item in items_query]
+        
+        items, totals = await asyncio.gather(
+            fetch_items(),
+            lines.aaggregate(subtotal=Sum(LINE_TOTAL), item_count=Sum('quantity')),
+        )
+        return CartSummary(items, totals['subtotal'] or Decimal('0.00'), totals['item_count'] or 0)
+
+# Cart Summary - what cart and checkout pages render
+class CartSummary:
+    def __init__(self, items, subtotal, item_count):
+        self.items = items
+        self.subtotal = subtotal
+        self.item_count = item_count
+    
+    def __bool__(self):
+        return bool(self.items)
+
+LINE_TOTAL = ExpressionWrapper(F('quantity') * F('product__price'),
+                               output_field=DecimalField(max_digits=12, decimal_places=2))
 
 # Cart Item Model (NEW)
 class CartItem(models.Model):
@@ -108,6 +166,11 @@ class CartItem(models.Model):
     quantity = models.IntegerField(default=1)
     added_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_product_per_cart'),
+        ]
+    
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
     
@@ -118,6 +181,90 @@ class CartItem(models.Model):
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # A staged upload waiting for the image workers (store/uploads.py); the profile shows a placeholder meanwhile
+    pending_picture = models.CharField(max_length=255, blank=True, default='')
+    # Why the last upload could not be used, shown on the profile until the next one
+    picture_error = models.CharField(max_length=200, blank=True, default='')
     
     def __str__(self):
-        return f"{self.user.username} Profile"
\ No newline at end of file
+        return f"{self.user.username} Profile"
+# Sales rollups - daily totals per order status, kept up to date by
+# store/rollups.py so sales reports never scan OrderItem
+class SalesRollup(models.Model):
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailySales(SalesRollup):
+    class Meta:
+        verbose_name_plural = 'daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status'], name='daily_sales_key'),
+        ]
+
+
+class DailyProductSales(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # The product's category when the row was created, so category reports need no join
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+
+    class Meta:
+        verbose_name_plural = 'daily product sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product', 'status'], name='daily_product_sales_key'),
+        ]
+
+
+class DailyCategorySales(SalesRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+
+    class Meta:
+        verbose_name_plural = 'daily category sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category', 'status'], name='daily_category_sales_key'),
+        ]
+
+
+# Outbox of customer notifications. Rows are written in the same transaction
+# as the order change and delivered later by manage.py send_notifications
+# (store/notifications.py), so a slow mail server never holds up a request.
+class Notification(models.Model):
+    KINDS = [
+        ('order_placed', 'Order placed'),
+        ('order_status', 'Order status changed'),
+    ]
+    STATUS = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='notifications')
+    recipient = models.EmailField()
+    # What the message says, as of the event - delivery renders from this alone
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set by the worker that claimed the row; the claim lapses at next_attempt_at
+    claimed_by = models.CharField(max_length=32, blank=True, editable=False)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "what is due" scan only ever walks pending rows
+            models.Index(fields=['next_attempt_at', 'id'], name='notification_due_idx',
+                         condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} - order {self.order_id} to {self.recipient}"
@@ -0,0 +1,131 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Notification, Order
+
+# Order notifications through a DB outbox. Enqueueing is one INSERT in the
+# caller's transaction, so a notification exists exactly when the order change
+# committed. The worker (manage.py send_notifications) claims due rows in
+# batches, sends them over one mail connection and retries failures with
+# exponential backoff until STORE_NOTIFICATION_MAX_ATTEMPTS.
+SUBJECTS = {
+    'order_placed': 'Your ShopKart order #{order_id} is confirmed',
+    'order_status': 'Your ShopKart order #{order_id} is now {status_label}',
+}
+
+
+def _enqueue(order, kind, **payload):
+    recipient = order.user.email
+    if not recipient:
+        return None
+    status_labels = dict(Order.ORDER_STATUS)
+    return Notification.objects.create(kind=kind, order=order, recipient=recipient, payload={
+        'order_id': order.id,
+        'username': order.user.get_full_name() or order.user.username,
+        'status': order.status,
+        'status_label': status_labels.get(order.status, order.status),
+        'total_price': f'{order.total_price:.2f}',
+        'item_count': order.item_count,
+        **payload,
+    })
+
+
+def notify_order_placed(order):
+    """Called by place_order inside its transaction"""
+    return _enqueue(order, 'order_placed')
+
+
+def notify_status_change(order, previous_status):
+    return _enqueue(order, 'order_status', previous_status=previous_status,
+                    previous_label=dict(Order.ORDER_STATUS).get(previous_status, previous_status))
+
+
+def retry_delay(attempts):
+    """Backoff before retry number `attempts`: doubling from the base, capped, +/-20% jitter"""
+    base = getattr(settings, 'STORE_NOTIFICATION_RETRY_BASE', 30)
+    cap = getattr(settings, 'STORE_NOTIFICATION_RETRY_MAX', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap) * random.uniform(0.8, 1.2))
+
+
+def claim_batch(batch_size):
+    """
+    Due notifications for this worker only. The claim is a conditional UPDATE,
+    so two workers never take the same row, and it pushes next_attempt_at out
+    by the lease: rows of a worker that dies are picked up again afterwards.
+    """
+    now = timezone.now()
+    due = list(Notification.objects.filter(status='pending', next_attempt_at__lte=now)
+               .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not due:
+        return []
+    token = uuid.uuid4().hex
+    lease = timedelta(seconds=getattr(settings, 'STORE_NOTIFICATION_LEASE', 300))
+    Notification.objects.filter(id__in=due, status='pending', next_attempt_at__lte=now).update(
+        claimed_by=token, next_attempt_at=now + lease)
+    return list(Notification.objects.filter(id__in=due, claimed_by=token).order_by('id'))
+
+
+def build_message(notification, connection=None):
+    payload = notification.payload
+    context = {**payload, 'track_url': getattr(settings, 'STORE_SITE_URL', '').rstrip('/')
+               + reverse('track_order', args=[payload['order_id']])}
+    return EmailMessage(
+        subject=SUBJECTS[notification.kind].format(**payload),
+        body=render_to_string(f'emails/{notification.kind}.txt', context),
+        to=[notification.recipient],
+        connection=connection,
+    )
+
+
+def _failed(notification, error):
+    notification.attempts += 1
+    notification.last_error = f'{type(error).__name__}: {error}'[:1000]
+    if notification.attempts >= getattr(settings, 'STORE_NOTIFICATION_MAX_ATTEMPTS', 8):
+        notification.status = 'failed'
+        return 'failed'
+    notification.next_attempt_at = timezone.now() + retry_delay(notification.attempts)
+    return 'retried'
+
+
+def deliver_batch(batch_size=100):
+    """Send one batch of due notifications; returns counts of sent, retried and failed"""
+    results = {'sent': 0, 'retried': 0, 'failed': 0}
+    batch = claim_batch(batch_size)
+    if not batch:
+        return results
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # The mail server is unreachable: the whole batch counts as one failed attempt
+        for notification in batch:
+            results[_failed(notification, e)] += 1
+    else:
+        try:
+            for notification in batch:
+                try:
+                    build_message(notification, connection).send()
+                except Exception as e:
+                    results[_failed(notification, e)] += 1
+                else:
+                    notification.attempts += 1
+                    notification.status = 'sent'
+                    notification.sent_at = timezone.now()
+                    notification.last_error = ''
+                    results['sent'] += 1
+        finally:
+            connection.close()
+
+    for notification in batch:
+        notification.claimed_by = ''
+    Notification.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'claimed_by',
+                                             'last_error', 'sent_at'])
+    return results
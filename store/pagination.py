@@ -0,0 +1,115 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.functions import Left
+
+# Columns the product card templates actually use
+CARD_FIELDS = ['id', 'name', 'price', 'image', 'created_at']
+SUMMARY_LENGTH = 200
+
+
+def encode_cursor(product):
+    """Encode the (created_at, id) position of a product as an opaque token"""
+    raw = json.dumps([product.created_at.isoformat(), product.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor token, returns None if it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def card_queryset(queryset):
+    """Restrict a Product queryset to the card columns plus a short description"""
+    return queryset.only(*CARD_FIELDS).annotate(
+        summary=Left('description', SUMMARY_LENGTH)
+    )
+
+
+class KeysetPage:
+    """One page of products ordered newest first, with the cursor of the next page"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _keyset_slice(queryset, cursor, page_size):
+    queryset = queryset.order_by('-created_at', '-id')
+
+    position = decode_cursor(cursor)
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+
+    # Fetch one extra row to know whether another page exists
+    return queryset[:page_size + 1]
+
+
+def _keyset_page(items, page_size):
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1])
+    return KeysetPage(items, next_cursor)
+
+
+def paginate_keyset(queryset, cursor=None, page_size=None):
+    """
+    Keyset pagination on (created_at, id) for any model that has both.
+    Deep pages cost the same as the first one because the position is a
+    WHERE clause, not an OFFSET.
+    """
+    page_size = page_size or getattr(settings, 'STORE_PAGE_SIZE', 24)
+    return _keyset_page(list(_keyset_slice(queryset, cursor, page_size)), page_size)
+
+
+def paginate_products(queryset, cursor=None, page_size=None):
+    """Newest-first page of product cards"""
+    return paginate_keyset(card_queryset(queryset), cursor, page_size)
+
+
+async def apaginate_products(queryset, cursor=None, page_size=None):
+    """paginate_products for async views, the same query through the async ORM"""
+    page_size = page_size or getattr(settings, 'STORE_PAGE_SIZE', 24)
+    queryset = _keyset_slice(card_queryset(queryset), cursor, page_size)
+    return _keyset_page([product async for product in queryset], page_size)
+
+
+def page_as_json(page):
+    """Serialize a page for infinite-scroll clients"""
+    return {
+        'results': [
+            {
+                'id': product.id,
+                'name': product.name,
+                'description': product.summary,
+                'price': str(product.price),
+                'image': product.image.url if product.image else None,
+            }
+            for product in page
+        ],
+        'next_cursor': page.next_cursor,
+    }
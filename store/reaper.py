@@ -0,0 +1,78 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cart, CartItem
+
+# Deletes abandoned guest carts and expired sessions a small batch at a time.
+# Each batch is its own short transaction followed by a pause, so the SQLite
+# write lock is only ever held for one batch and checkouts get in between.
+
+
+def _batches(select, delete, batch_size, pause, max_batches):
+    """Run delete(keys) over select(batch_size) until it comes back empty"""
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        keys = select(batch_size)
+        if not keys:
+            break
+        with transaction.atomic():
+            delete(keys)
+        batches += 1
+        if len(keys) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+
+def reap_guest_carts(older_than, batch_size=500, pause=0.1, dry_run=False, max_batches=None):
+    """Cart rows without a user, untouched since `older_than`, oldest first"""
+    stale = Cart.objects.filter(user__isnull=True, updated_at__lt=older_than)
+    report = {'carts': 0, 'items': 0, 'oldest': stale.order_by('updated_at')
+              .values_list('updated_at', flat=True).first()}
+    if dry_run:
+        report['carts'] = stale.count()
+        report['items'] = CartItem.objects.filter(cart__in=stale).count()
+        return report
+
+    def select(size):
+        return list(stale.order_by('updated_at', 'id').values_list('id', flat=True)[:size])
+
+    def delete(ids):
+        # The filter is repeated so a cart touched since the select survives
+        ids = list(stale.filter(id__in=ids).values_list('id', flat=True))
+        report['items'] += CartItem.objects.filter(cart_id__in=ids).delete()[0]
+        report['carts'] += Cart.objects.filter(id__in=ids).delete()[1].get(Cart._meta.label, 0)
+
+    _batches(select, delete, batch_size, pause, max_batches)
+    return report
+
+
+def session_model():
+    """The model of a database-backed SESSION_ENGINE, None for cookies, files or cache only"""
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    return store.get_model_class() if hasattr(store, 'get_model_class') else None
+
+
+def reap_sessions(batch_size=500, pause=0.1, dry_run=False, max_batches=None):
+    """Expired rows of the session table, soonest expired first"""
+    model = session_model()
+    if model is None:
+        return None
+    expired = model.objects.filter(expire_date__lt=timezone.now())
+    report = {'sessions': 0}
+    if dry_run:
+        report['sessions'] = expired.count()
+        return report
+
+    def select(size):
+        return list(expired.order_by('expire_date').values_list('session_key', flat=True)[:size])
+
+    def delete(keys):
+        report['sessions'] += expired.filter(session_key__in=keys).delete()[0]
+
+    _batches(select, delete, batch_size, pause, max_batches)
+    return report
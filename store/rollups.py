@@ -0,0 +1,116 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyCategorySales, DailyProductSales, DailySales, OrderItem
+
+# Daily sales rollups. Every event touches one order, so one day and one
+# status: each table gets an INSERT ... ON CONFLICT DO NOTHING for its keys
+# and one UPDATE adding the deltas, whatever the number of lines. Writes
+# that bypass Order.save() (queryset.update, raw SQL, edits to OrderItems)
+# are not seen; rebuild_rollups restates any range from the orders.
+REVENUE = DecimalField(max_digits=14, decimal_places=2)
+
+
+def order_lines(order):
+    """(product_id, category_id, quantity, price) for each line of a saved order"""
+    return list(OrderItem.objects.filter(order=order)
+                .values_list('product_id', 'product__category_id', 'quantity', 'price'))
+
+
+def _add(model, day, status, key, deltas, sign, extra=None):
+    """Add sign * (orders, units, revenue) to each keyed row of one day and status"""
+    extra = extra or {}
+    model.objects.bulk_create([
+        model(date=day, status=status, **({key: pk} if key else {}), **extra.get(pk, {}))
+        for pk in deltas
+    ], ignore_conflicts=True)
+
+    rows = model.objects.filter(date=day, status=status)
+    if key:
+        rows = rows.filter(**{f'{key}__in': list(deltas)})
+
+    def delta(index, output_field):
+        if not key:
+            return Value(sign * deltas[None][index], output_field=output_field)
+        return Case(*[When(**{key: pk}, then=Value(sign * values[index])) for pk, values in deltas.items()],
+                    output_field=output_field)
+
+    rows.update(orders=F('orders') + delta(0, IntegerField()),
+                units=F('units') + delta(1, IntegerField()),
+                revenue=F('revenue') + delta(2, REVENUE))
+
+
+def apply_order(order, lines, status, sign=1):
+    day = timezone.localdate(order.created_at)
+    totals = [1, 0, Decimal('0.00')]
+    products = defaultdict(lambda: [1, 0, Decimal('0.00')])
+    categories = defaultdict(lambda: [1, 0, Decimal('0.00')])
+    product_categories = {}
+    for product_id, category_id, quantity, price in lines:
+        for values in (totals, products[product_id], categories[category_id]):
+            values[1] += quantity
+            values[2] += quantity * price
+        product_categories[product_id] = {'category_id': category_id}
+
+    with transaction.atomic():
+        _add(DailySales, day, status, None, {None: totals}, sign)
+        _add(DailyProductSales, day, status, 'product_id', products, sign, extra=product_categories)
+        _add(DailyCategorySales, day, status, 'category_id', categories, sign)
+
+
+def record_order(order, lines):
+    """A new order; called by place_order inside its transaction"""
+    apply_order(order, lines, order.status)
+
+
+def record_status_change(order, previous_status):
+    """Move an order's totals from its previous status to the current one"""
+    lines = order_lines(order)
+    with transaction.atomic():
+        apply_order(order, lines, previous_status, sign=-1)
+        apply_order(order, lines, order.status)
+
+
+def record_order_deleted(order):
+    apply_order(order, order_lines(order), order.status, sign=-1)
+
+
+def rebuild(since=None, batch_size=5000):
+    """
+    Recompute the rollups from orders, all of them or those placed on or
+    after `since`, in one transaction. Returns the number of rows written.
+    """
+    items = OrderItem.objects.annotate(day=TruncDate('order__created_at'), order_status=F('order__status'))
+    if since:
+        items = items.filter(day__gte=since)
+    sums = {
+        'orders': Count('order', distinct=True),
+        'units': Sum('quantity'),
+        'revenue': Sum(F('quantity') * F('price'), output_field=REVENUE),
+    }
+    sources = [
+        (DailySales, items.values('day', 'order_status')),
+        (DailyProductSales, items.values('day', 'order_status', 'product_id',
+                                         category_id=F('product__category_id'))),
+        (DailyCategorySales, items.values('day', 'order_status', category_id=F('product__category_id'))),
+    ]
+    written = 0
+    with transaction.atomic():
+        for model, groups in sources:
+            stale = model.objects.filter(date__gte=since) if since else model.objects.all()
+            stale.delete()
+            groups = groups.annotate(**sums).order_by()
+            batch = []
+            for row in groups.iterator(chunk_size=batch_size):
+                row['date'], row['status'] = row.pop('day'), row.pop('order_status')
+                batch.append(model(**row))
+                if len(batch) >= batch_size:
+                    written += len(model.objects.bulk_create(batch))
+                    batch = []
+            written += len(model.objects.bulk_create(batch))
+    return written
@@ -0,0 +1,75 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Set for the duration of a catalog view; cleared by read-your-writes stickiness
+_replica_reads = ContextVar('replica_reads', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+# Only catalog data may come from a replica; sessions, users, carts and
+# orders are always read from the primary so nobody sees their own write lag
+REPLICA_MODELS = {'store.product', 'store.category'}
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def pinned_to_primary():
+    token = _pinned_to_primary.set(True)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+def read_from_replica(view):
+    """Let a catalog view read Product/Category from a read replica"""
+    if iscoroutinefunction(view):
+        # The context variable follows the async ORM into its worker thread
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with replica_reads():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Catalog reads inside read_from_replica views go to a random replica,
+    everything else (all writes, cart, checkout, auth) to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'STORE_READ_REPLICAS', [])
+        if (replicas and _replica_reads.get() and not _pinned_to_primary.get()
+                and model._meta.label_lower in REPLICA_MODELS):
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'STORE_READ_REPLICAS', [])
@@ -0,0 +1,219 @@
+import re
+import sqlite3
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Product
+from .pagination import KeysetPage, card_queryset
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def indexable_rows(queryset):
+    """(id, name, description, category name) rows for the search index"""
+    return queryset.values_list('id', 'name', 'description', 'category__name').iterator(chunk_size=2000)
+
+
+class BaseSearchBackend:
+    """
+    A search backend maps a free-text query to product ids, best match
+    first. Backends that keep their own index get told about changes
+    through index_products() and remove_products().
+    """
+
+    def search(self, query, limit, offset=0):
+        raise NotImplementedError
+
+    def index_products(self, rows):
+        pass
+
+    def remove_products(self, ids):
+        pass
+
+    def rebuild(self, rows):
+        pass
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """The original name__icontains lookup - a full table scan per query"""
+
+    def search(self, query, limit, offset=0):
+        ids = (Product.objects.filter(name__icontains=query)
+               .order_by('-created_at', '-id')
+               .values_list('id', flat=True))
+        return list(ids[offset:offset + limit])
+
+
+class FTS5SearchBackend(BaseSearchBackend):
+    """
+    Inverted index over product name, description and category name kept in
+    a local SQLite FTS5 table. Results are ranked with bm25 (name matches
+    weigh the most) and every query term is matched as a prefix.
+    """
+
+    WEIGHTS = (10.0, 1.0, 4.0)
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5("
+                "name, description, category, "
+                "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def match_expression(query):
+        tokens = TOKEN_RE.findall(query.lower())
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, query, limit, offset=0):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT rowid FROM product_search WHERE product_search MATCH ? "
+                "ORDER BY bm25(product_search, ?, ?, ?) LIMIT ? OFFSET ?",
+                (expression, *self.WEIGHTS, limit, offset),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _write(self, rows, clear=False):
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN')
+            try:
+                if clear:
+                    conn.execute('DELETE FROM product_search')
+                for chunk in _chunks(rows, 2000):
+                    if not clear:
+                        conn.executemany('DELETE FROM product_search WHERE rowid = ?',
+                                         [(row[0],) for row in chunk])
+                    conn.executemany(
+                        'INSERT INTO product_search (rowid, name, description, category) '
+                        'VALUES (?, ?, ?, ?)', chunk)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def index_products(self, rows):
+        self._write(rows)
+
+    def remove_products(self, ids):
+        with self._lock:
+            self._connection().executemany('DELETE FROM product_search WHERE rowid = ?',
+                                           [(pk,) for pk in ids])
+
+    def rebuild(self, rows):
+        self._write(rows, clear=True)
+        with self._lock:
+            self._connection().execute(
+                "INSERT INTO product_search (product_search) VALUES ('optimize')")
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Backend configured by settings.STORE_SEARCH, created once per process"""
+    global _backend
+    if _backend is None:
+        config = getattr(settings, 'STORE_SEARCH', {})
+        backend_class = import_string(config.get('BACKEND', 'store.search.FTS5SearchBackend'))
+        options = config.get('OPTIONS', {})
+        if backend_class is FTS5SearchBackend and 'path' not in options:
+            options = {**options, 'path': settings.BASE_DIR / 'search_index.sqlite3'}
+        _backend = backend_class(**options)
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_search_backend(setting, **kwargs):
+    global _backend
+    if setting == 'STORE_SEARCH':
+        _backend = None
+
+
+def _ranked_ids(query, cursor, page_size):
+    page_size = page_size or getattr(settings, 'STORE_PAGE_SIZE', 24)
+    try:
+        offset = max(int(cursor or 0), 0)
+    except ValueError:
+        offset = 0
+
+    ids = get_search_backend().search(query, page_size + 1, offset)
+    next_cursor = str(offset + page_size) if len(ids) > page_size else None
+    return ids[:page_size], next_cursor
+
+
+def search_page(query, cursor=None, page_size=None):
+    """Ranked search results as a page; the cursor is the rank offset"""
+    ids, next_cursor = _ranked_ids(query, cursor, page_size)
+    # Ids from the index can lag a delete, so keep only the ones still present
+    products = card_queryset(Product.objects.filter(id__in=ids)).in_bulk()
+    return KeysetPage([products[pk] for pk in ids if pk in products], next_cursor)
+
+
+def filtered_search_page(query, queryset, cursor=None, page_size=None):
+    """
+    Ranked results limited to `queryset` (e.g. one category). The index knows
+    nothing of the filter, so ranked ids are read in growing chunks and kept
+    if the queryset has them, until the page is full or the matches run out.
+    The cursor is the rank offset of the next match, so it is only set when
+    there is one. At most STORE_SEARCH_MAX_SCAN ranks are read per call; a
+    rare filter on a broad query may end a page early there, cursor set.
+    """
+    page_size = page_size or getattr(settings, 'STORE_PAGE_SIZE', 24)
+    try:
+        offset = max(int(cursor or 0), 0)
+    except ValueError:
+        offset = 0
+    scan_limit = offset + getattr(settings, 'STORE_SEARCH_MAX_SCAN', 2000)
+    found = []
+    chunk_size = page_size + 1
+    while True:
+        ids = get_search_backend().search(query, chunk_size, offset)
+        matches = queryset.in_bulk(ids)
+        for position, pk in enumerate(ids):
+            if pk in matches:
+                if len(found) == page_size:
+                    return KeysetPage(found, str(offset + position))
+                found.append(matches[pk])
+        offset += len(ids)
+        if len(ids) < chunk_size:
+            return KeysetPage(found, None)
+        if offset >= scan_limit:
+            return KeysetPage(found, str(offset))
+        chunk_size = min(chunk_size * 2, 1000)
+
+
+async def asearch_page(query, cursor=None, page_size=None):
+    """search_page for async views; the index lookup runs in a worker thread"""
+    ids, next_cursor = await sync_to_async(_ranked_ids)(query, cursor, page_size)
+    products = await card_queryset(Product.objects.filter(id__in=ids)).ain_bulk()
+    return KeysetPage([products[pk] for pk in ids if pk in products], next_cursor)
@@ -0,0 +1,128 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .cache import bump_version, bump_versions
+from .models import Cart, CartItem, Order, OrderItem, Product
+from .notifications import notify_order_placed
+from .rollups import record_order
+
+
+class EmptyCartError(Exception):
+    pass
+
+
+class OutOfStockError(Exception):
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(product.name for product in products)
+        super().__init__(f'Not enough stock for: {names}')
+
+
+def place_order(user, cart, address=None, payment_method='card'):
+    """
+    Turn a cart into an Order in one transaction.
+
+    Products are locked in id order (a no-op on SQLite, row locks on
+    PostgreSQL/MySQL), checked for stock and decremented by a single
+    conditional UPDATE, so two buyers of the last unit can never both
+    succeed. Prices are snapshotted from the locked rows, the order's
+    summary fields are filled in, all OrderItems are inserted with one
+    bulk_create, the day's sales rollups are updated and the confirmation
+    email is queued in the outbox. Any failure rolls the whole order back.
+    """
+    with transaction.atomic():
+        # Write first: takes SQLite's write lock before any read (so the lock
+        # never has to be upgraded mid-transaction) and row-locks the cart
+        # elsewhere, serialising double submits of the same cart
+        Cart.objects.filter(id=cart.id).update(updated_at=timezone.now())
+
+        quantities = dict(CartItem.objects.filter(cart=cart).order_by('added_at', 'id')
+                          .values_list('product_id', 'quantity'))
+        if not quantities:
+            raise EmptyCartError('Cart is empty')
+
+        products = list(Product.objects.select_for_update()
+                        .filter(id__in=quantities).order_by('id')
+                        .only('id', 'name', 'price', 'stock', 'image', 'category'))
+        short = [product for product in products if product.stock < quantities[product.id]]
+        if short or len(products) != len(quantities):
+            raise OutOfStockError(short)
+
+        # Re-check stock in the UPDATE itself for backends without row locks
+        in_stock = Q()
+        for product in products:
+            in_stock |= Q(id=product.id, stock__gte=quantities[product.id])
+        updated = Product.objects.filter(in_stock).update(stock=Case(
+            *[When(id=product.id, then=F('stock') - quantities[product.id]) for product in products],
+            output_field=IntegerField(),
+        ))
+        if updated != len(products):
+            # Another checkout took the stock between our read and write
+            raise OutOfStockError(products)
+
+        total_price = sum((product.price * quantities[product.id] for product in products), Decimal('0.00'))
+        first_product = next(product for product in products if product.id == next(iter(quantities)))
+        order = Order.objects.create(
+            user=user,
+            total_price=total_price,
+            shipping_address=address,
+            payment_method=payment_method,
+            payment_status='pending',
+            item_count=sum(quantities.values()),
+            line_count=len(quantities),
+            thumbnail=first_product.image.name,
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=product.id,
+                      quantity=quantities[product.id], price=product.price)
+            for product in products
+        ])
+        record_order(order, [(product.id, product.category_id, quantities[product.id], product.price)
+                             for product in products])
+        notify_order_placed(order)
+        CartItem.objects.filter(cart=cart).delete()
+        # Stock shown on product pages and listings changed, so their ETags must too
+        product_ids = [product.id for product in products]
+        category_ids = {product.category_id for product in products}
+
+        def bump():
+            bump_versions('product', product_ids)
+            bump_version('products')
+            bump_versions('category', category_ids)
+        transaction.on_commit(bump)
+    return order
+
+
+def update_cart_lines(cart, quantities, replace=False):
+    """
+    Add {product_id: quantity} to a cart in a fixed number of queries: one
+    read of the existing lines, one conditional UPDATE, one bulk INSERT
+    and, with replace=True (quantities are set rather than added, 0
+    removes a line), one DELETE. Product ids must already be validated.
+    """
+    with transaction.atomic():
+        # Write first, as in place_order, so SQLite takes its write lock up front
+        Cart.objects.filter(id=cart.id).update(updated_at=timezone.now())
+        existing = dict(CartItem.objects.filter(cart=cart, product_id__in=quantities)
+                        .values_list('product_id', 'id'))
+        if replace:
+            removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+            if removed:
+                CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
+            quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity > 0}
+
+        kept = [product_id for product_id in existing if product_id in quantities]
+        if kept:
+            new_quantity = Case(
+                *[When(product_id=product_id, then=Value(quantities[product_id])) for product_id in kept],
+                output_field=IntegerField(),
+            )
+            CartItem.objects.filter(cart=cart, product_id__in=kept).update(
+                quantity=new_quantity if replace else F('quantity') + new_quantity)
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, product_id=product_id, quantity=quantity)
+            for product_id, quantity in quantities.items() if product_id not in existing
+        ])
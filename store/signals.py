@@ -0,0 +1,131 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Category, Order, Product, UserProfile
+from .search import get_search_backend, indexable_rows
+from .suggest import suggestion_index
+from .cache import bump_version, bump_versions
+from .guest_cart import merge_guest_cart
+from .images import derivatives_ready, schedule_renditions
+from .sqlite import apply_pragmas
+from .rollups import record_order_deleted, record_status_change
+from .notifications import notify_status_change
+
+
+# SQLite tuning pragmas (WAL, busy_timeout...) on every new connection
+connection_created.connect(apply_pragmas, dispatch_uid='store_sqlite_pragmas')
+
+
+# Keep the search index in step with the catalog once the write commits
+@receiver(post_save, sender=Product)
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    row = (instance.id, instance.name, instance.description, instance.category.name)
+    transaction.on_commit(lambda: get_search_backend().index_products([row]))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, **kwargs):
+    pk = instance.id
+    transaction.on_commit(lambda: get_search_backend().remove_products([pk]))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    products = Product.objects.filter(category=instance)
+    transaction.on_commit(lambda: get_search_backend().index_products(indexable_rows(products)))
+
+
+# Typeahead index is rebuilt lazily on the next suggest request
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def mark_suggestions_stale(sender, **kwargs):
+    suggestion_index.mark_stale()
+
+
+# Fragment cache versions - old card and category bar keys are simply never read again.
+# Listings key their ETags on the catalog-wide and per-category versions.
+@receiver(pre_save, sender=Product)
+def remember_previous_category(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._previous_category_id = (Product.objects.filter(pk=instance.pk)
+                                          .values_list('category_id', flat=True).first())
+
+
+@receiver([post_save, post_delete], sender=Product)
+def bump_product_version(sender, instance, **kwargs):
+    # After commit: a bump inside the transaction would let another request
+    # cache the old rows under the new version
+    product_id = instance.id
+    category_ids = {instance.category_id, getattr(instance, '_previous_category_id', None)} - {None}
+
+    def bump():
+        bump_version('product', product_id)
+        bump_version('products')
+        bump_versions('category', category_ids)
+    transaction.on_commit(bump)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def bump_category_version(sender, instance, **kwargs):
+    category_id = instance.id
+
+    def bump():
+        bump_version('categories')
+        bump_version('category', category_id)
+    transaction.on_commit(bump)
+
+
+# Guest carts only become Cart rows once the visitor logs in (or signs up)
+@receiver(user_logged_in)
+def materialise_guest_cart(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        merge_guest_cart(request, user)
+
+
+# Size/format renditions are generated on the worker pool as soon as an image is uploaded
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=UserProfile)
+def queue_image_renditions(sender, instance, raw=False, **kwargs):
+    image = instance.image if sender is Product else instance.profile_picture
+    if raw or not image or derivatives_ready(image.name):
+        return
+    transaction.on_commit(lambda: schedule_renditions(image))
+
+
+# Sales rollups and the customer's notification follow an order's status;
+# new orders are recorded (and notified) by place_order
+@receiver(pre_save, sender=Order)
+def remember_previous_status(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._previous_status = (Order.objects.filter(pk=instance.pk)
+                                     .values_list('status', flat=True).first())
+
+
+@receiver(post_save, sender=Order)
+def move_order_rollups(sender, instance, created=False, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_status', None)
+    if created or raw or previous is None or previous == instance.status:
+        return
+    record_status_change(instance, previous)
+    notify_status_change(instance, previous)
+    instance._previous_status = instance.status
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_rollups(sender, instance, **kwargs):
+    record_order_deleted(instance)
+
+
+# Every user gets a profile when the account is created, so read paths never write one
+@receiver(post_save, sender=User)
+def create_user_profile(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        UserProfile.objects.get_or_create(user=instance)
@@ -0,0 +1,116 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+
+# The 'tuned' profile (DB_SQLITE_PROFILE in settings), also run by benchmark_sqlite_writes
+TUNED_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative means KiB, so 64 MiB
+    'busy_timeout': 20000,
+    'temp_store': 'MEMORY',
+}
+
+
+# Connection init - runs once per new connection (connection_created signal)
+def apply_pragmas(sender, connection, **kwargs):
+    """
+    Apply STORE_SQLITE_PRAGMAS to every new SQLite connection. journal_mode
+    is stored in the database file, the others are per connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'STORE_SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+PRAGMA_NAMES = ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout')
+
+
+def current_pragmas(using=DEFAULT_DB_ALIAS):
+    """The values a connection actually ended up with, for benchmarks and checks"""
+    with connections[using].cursor() as cursor:
+        values = {}
+        for name in PRAGMA_NAMES:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            # mmap_size has no value on in-memory databases
+            values[name] = row[0] if row else None
+    return values
+
+
+class WriteQueue:
+    """
+    FIFO lock for writers inside one process. SQLite allows a single writer,
+    and its busy handler polls with growing sleeps, so under load writers
+    either wait much longer than needed or run out of busy_timeout and fail
+    with "database is locked". Queueing them here hands the lock over in
+    arrival order instead. Re-entrant, so a queued view can call a queued
+    service.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._owner = None
+        self._depth = 0
+        self.waiting = 0
+
+    def acquire(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._owner == me:
+                self._depth += 1
+                return
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self.waiting += 1
+            while ticket != self._serving:
+                self._condition.wait()
+            self.waiting -= 1
+            self._owner, self._depth = me, 1
+
+    def release(self):
+        with self._condition:
+            self._depth -= 1
+            if self._depth:
+                return
+            self._owner = None
+            self._serving += 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def writer(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+write_queue = WriteQueue()
+
+
+def write_queue_enabled():
+    return getattr(settings, 'STORE_SQLITE_WRITE_QUEUE', False) and connection.vendor == 'sqlite'
+
+
+def serialize_writes(view_func):
+    """Run a writing view through the write queue when STORE_SQLITE_WRITE_QUEUE is on"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not write_queue_enabled():
+            return view_func(request, *args, **kwargs)
+        with write_queue.writer():
+            return view_func(request, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,45 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip variants are always written
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml')
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Hashed file names (store/css/shopkart.3f2a9c.css) plus .gz and .br
+    siblings written at collectstatic time, so the file handler can send
+    precompressed bytes without compressing per request.
+    """
+
+    min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            if name.endswith(COMPRESSIBLE):
+                self.compress(self.path(name))
+
+    def compress(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < self.min_size:
+            return
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, compressed in variants:
+            # Only keep variants that actually save bytes
+            if len(compressed) < len(data):
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
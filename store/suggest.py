@@ -0,0 +1,114 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+
+from .models import Category, Product
+
+SEPARATOR = '\x00'
+# Sorts after every character a real name can contain
+HIGHEST = '\U0010ffff'
+
+
+class SuggestionIndex:
+    """
+    Sorted array of name prefixes answered with bisect, kept in process
+    memory so typeahead never touches the database.
+
+    Each entry is one flat string "key\\0kind\\0id\\0display" - far smaller
+    than a trie of dicts or a list of tuples. A name is indexed from its
+    start and from each later word, so "head" finds "Wireless Headphones".
+    The index holds at most max_entries strings, newest products first.
+    """
+
+    def __init__(self, max_entries=None, max_age=None):
+        self.max_entries = max_entries or getattr(settings, 'STORE_SUGGEST_MAX_ENTRIES', 500_000)
+        self.max_age = max_age or getattr(settings, 'STORE_SUGGEST_MAX_AGE', 300)
+        self._entries = []
+        self._built_at = None
+        self._generation = 0
+        self._built_generation = -1
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    @staticmethod
+    def _entries_for(kind, pk, name):
+        words = name.lower().split()
+        for i in range(len(words)):
+            yield SEPARATOR.join((' '.join(words[i:]), kind, str(pk), name))
+
+    def _names(self):
+        yield from (('category', pk, name) for pk, name in
+                    Category.objects.values_list('id', 'name').iterator())
+        yield from (('product', pk, name) for pk, name in
+                    Product.objects.order_by('-created_at').values_list('id', 'name').iterator(chunk_size=5000))
+
+    def build(self):
+        generation = self._generation
+        entries = []
+        for kind, pk, name in self._names():
+            if len(entries) >= self.max_entries:
+                break
+            entries.extend(self._entries_for(kind, pk, name))
+        del entries[self.max_entries:]
+        entries.sort()
+        self._entries = entries
+        self._built_at = time.monotonic()
+        self._built_generation = generation
+
+    def mark_stale(self):
+        self._generation += 1
+
+    def _needs_rebuild(self):
+        if self._built_generation != self._generation:
+            return True
+        # Other processes' writes are only seen once the index ages out
+        return time.monotonic() - self._built_at > self.max_age
+
+    def _rebuild_in_background(self):
+        try:
+            self.build()
+        finally:
+            self._rebuilding = False
+            # The thread ends here; its connection would otherwise stay open
+            connections.close_all()
+
+    def ensure_fresh(self):
+        if not self._needs_rebuild():
+            return
+        with self._lock:
+            if self._built_at is None:
+                # Nothing to serve yet, build before answering
+                self.build()
+            elif not self._rebuilding and self._needs_rebuild():
+                # Keep answering from the old index while a new one is built
+                self._rebuilding = True
+                threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def suggest(self, query, limit=10):
+        prefix = ' '.join(query.lower().split())
+        if not prefix:
+            return []
+        self.ensure_fresh()
+        entries = self._entries
+        start = bisect_left(entries, prefix)
+        end = bisect_left(entries, prefix + HIGHEST, start)
+
+        results, seen = [], set()
+        for i in range(start, end):
+            _, kind, pk, display = entries[i].split(SEPARATOR)
+            if (kind, pk) in seen:
+                continue
+            seen.add((kind, pk))
+            results.append({'text': display, 'type': kind, 'id': int(pk)})
+            if len(results) == limit:
+                break
+        return results
+
+    def __len__(self):
+        return len(self._entries)
+
+
+suggestion_index = SuggestionIndex()
@@ -0,0 +1,27 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from store.images import MIME_TYPES, renditions
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes='100vw', css_class=''):
+    """
+    <picture> with AVIF/WebP/JPEG srcsets sized for the slot the image is
+    shown in. Falls back to the original file until the renditions exist.
+    """
+    if not image:
+        return ''
+    sets = renditions(image)
+    if sets is None:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="lazy">', image.url, alt, css_class)
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], srcset, sizes) for fmt, srcset in sets.items() if fmt != 'jpeg'),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy"></picture>',
+        sources, image.url, sets['jpeg'], sizes, alt, css_class,
+    )
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+
+
+class ReplicaAwareTestRunner(DiscoverRunner):
+    """
+    With DB_REPLICAS set, every replica alias mirrors the test database.
+    Separate SQLite connections cannot see (or would lock against) the data
+    a TestCase keeps in its open transaction, so replica aliases share the
+    primary's connection. The router still decides which alias each query
+    asks for, which is what the tests check.
+    """
+
+    def setup_databases(self, **kwargs):
+        old_config = super().setup_databases(**kwargs)
+        for alias in getattr(settings, 'STORE_READ_REPLICAS', []):
+            connections[alias] = connections[DEFAULT_DB_ALIAS]
+        return old_config
@@ -1,3 +1,1229 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from .assets import serve_file
+from .benchmarking import compare_runs, seed_catalog, seed_shopper, seed_store
+from .cache import bump_version, cache_stats, cached_categories, get_versions
+from .catalog_io import CatalogImporter, export_rows, format_rows, read_rows
+from .checks import check_fragment_cache, check_session_cache
+from .images import FORMATS, DerivativeQueue, derivative_name, derivatives_ready, renditions
+from .instrumentation import RequestStats, metrics
+from .management.commands.audit_query_plans import Command as AuditQueryPlansCommand
+from .models import (Cart, CartItem, Category, DailyCategorySales, DailyProductSales, DailySales, Notification,
+                     Order, OrderItem, Product, UserProfile)
+from .notifications import claim_batch, deliver_batch
+from .reaper import reap_guest_carts, reap_sessions
+from .rollups import rebuild
+from .routers import ReplicaRouter, pinned_to_primary, replica_reads
+from .search import get_search_backend, indexable_rows
+from .services import OutOfStockError, place_order
+from .sqlite import WriteQueue, apply_pragmas, current_pragmas
+from .suggest import SuggestionIndex
+from .uploads import PROCESSING_FAILED, staging_storage
+
+
+# The suite is one process, so its LocMem session cache stands in for the
+# shared cache cached_db needs in production; query counts assume it. The
+# search index is kept in memory so tests never write to the real one.
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+                   STORE_SEARCH={'BACKEND': 'store.search.FTS5SearchBackend', 'OPTIONS': {'path': ':memory:'}})
+class StoreTestCase(TestCase):
+    # Replica aliases (DB_REPLICAS) mirror the test database
+    databases = '__all__'
+
+
+def make_products(category, count, prefix='Product'):
+    return [
+        Product.objects.create(
+            name=f'{prefix} {i}', description='word ' * 50,
+            price=Decimal('10.00'), category=category, stock=5,
+        )
+        for i in range(count)
+    ]
+
+
+@override_settings(STORE_PAGE_SIZE=3)
+class CatalogPaginationTests(StoreTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Books')
+        self.products = make_products(self.category, 7)
+
+    def test_cursor_walks_every_product_once(self):
+        seen = []
+        cursor = ''
+        while True:
+            data = self.client.get(reverse('home'), {'format': 'json', 'cursor': cursor}).json()
+            seen += [item['id'] for item in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, sorted((p.id for p in self.products), reverse=True))
+
+    def test_page_query_count_is_constant(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('products_by_category', args=[self.category.id]))
+        self.assertEqual(len(response.context['products']), 3)
+        self.assertTrue(response.context['products'].has_next)
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        data = self.client.get(reverse('search_products'), {'format': 'json', 'cursor': '!!'}).json()
+        self.assertEqual(len(data['results']), 3)
+
+
+class ProductSearchTests(StoreTestCase):
+    def setUp(self):
+        self.electronics = Category.objects.create(name='Electronics')
+        self.kitchen = Category.objects.create(name='Kitchen')
+        self.headphones = Product.objects.create(
+            name='Wireless Headphones', description='Over-ear with noise cancelling',
+            price=Decimal('99.00'), category=self.electronics)
+        self.bottle = Product.objects.create(
+            name='Steel Bottle', description='Keeps water cold, pairs with wireless gear',
+            price=Decimal('15.00'), category=self.kitchen)
+        get_search_backend().rebuild(indexable_rows(Product.objects.all()))
+
+    def search(self, query):
+        response = self.client.get(reverse('search_products'), {'q': query})
+        return [product.id for product in response.context['products']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('wireless'), [self.headphones.id, self.bottle.id])
+
+    def test_prefix_and_category_matching(self):
+        self.assertEqual(self.search('head'), [self.headphones.id])
+        self.assertEqual(self.search('kitch'), [self.bottle.id])
+
+    def test_signals_update_index_incrementally(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mug = Product.objects.create(name='Ceramic Mug', description='Tea',
+                                         price=Decimal('5.00'), category=self.kitchen)
+        self.assertEqual(self.search('ceramic'), [mug.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.electronics.name = 'Audio'
+            self.electronics.save()
+        self.assertEqual(self.search('audio'), [self.headphones.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mug.delete()
+        self.assertEqual(get_search_backend().search('ceramic', 10), [])
+
+
+class SearchSuggestTests(StoreTestCase):
+    def setUp(self):
+        audio = Category.objects.create(name='Audio')
+        self.headphones = Product.objects.create(
+            name='Wireless Headphones', description='', price=Decimal('99.00'), category=audio)
+        Product.objects.create(name='Wired Earphones', description='', price=Decimal('9.00'), category=audio)
+        self.index = SuggestionIndex(max_entries=100)
+
+    def test_suggest_answers_from_memory(self):
+        self.index.build()
+        with self.assertNumQueries(0):
+            texts = [s['text'] for s in self.index.suggest('wire')]
+        self.assertEqual(texts, ['Wired Earphones', 'Wireless Headphones'])
+        self.assertEqual([s['text'] for s in self.index.suggest('head')], ['Wireless Headphones'])
+        self.assertEqual([s['type'] for s in self.index.suggest('aud')], ['category'])
+
+    def test_index_is_bounded(self):
+        index = SuggestionIndex(max_entries=3)
+        index.build()
+        self.assertEqual(len(index), 3)
+
+    def test_background_rebuild_closes_its_connection(self):
+        self.index._rebuilding = True
+        with mock.patch('store.suggest.connections.close_all') as close_all:
+            self.index._rebuild_in_background()
+        close_all.assert_called_once_with()
+        self.assertFalse(self.index._rebuilding)
+        self.assertTrue(self.index.suggest('wire'))
+
+    def test_suggest_endpoint(self):
+        with mock.patch('store.views.suggestion_index', self.index):
+            data = self.client.get(reverse('search_suggest'), {'q': 'wireless'}).json()
+        self.assertEqual(data['suggestions'][0]['url'], reverse('product_detail', args=[self.headphones.id]))
+
+
+class FragmentCacheTests(StoreTestCase):
+    def setUp(self):
+        caches['fragments'].clear()
+        cache_stats.reset()
+        self.category = Category.objects.create(name='Toys')
+        self.product = make_products(self.category, 1)[0]
+
+    def test_warm_listing_skips_category_query_and_card_rendering(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('home'))
+        stats = cache_stats.snapshot()
+        self.assertEqual(stats['product_card'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+        self.assertEqual(stats['categories']['hits'], 1)
+
+    def test_saves_invalidate_exactly(self):
+        self.client.get(reverse('home'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Renamed Robot'
+            self.product.save()
+            self.category.name = 'Games'
+            self.category.save()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Renamed Robot')
+        self.assertContains(response, 'Games')
+
+    def test_versions_move_only_after_commit(self):
+        before = get_versions('product', [self.product.id])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.save()
+        self.assertEqual(get_versions('product', [self.product.id]), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_versions('product', [self.product.id]), before)
+
+    @override_settings(STORE_FRAGMENT_TIMEOUT=45)
+    def test_versions_and_category_bar_expire(self):
+        cache = caches['fragments']
+        with mock.patch.object(cache, 'set', wraps=cache.set) as set_one, \
+                mock.patch.object(cache, 'set_many', wraps=cache.set_many) as set_many:
+            cached_categories()
+            bump_version('product', self.product.id)
+        timeouts = [call.kwargs['timeout'] for call in set_one.call_args_list + set_many.call_args_list]
+        self.assertEqual(set(timeouts), {45})
+
+    def test_process_local_cache_with_several_workers_is_flagged(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual([warning.id for warning in check_fragment_cache(None)], ['store.W002'])
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '1'}):
+            self.assertEqual(check_fragment_cache(None), [])
+
+
+class GuestCartTests(StoreTestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Stationery')
+        self.pen, self.ink = make_products(category, 2)
+        self.user = User.objects.create_user('asha', password='pass12345')
+
+    def test_guest_cart_writes_no_cart_rows(self):
+        self.client.post(reverse('add_to_cart', args=[self.pen.id]))
+        self.client.post(reverse('add_to_cart', args=[self.pen.id]))
+        self.client.post(reverse('update_cart_quantity', args=[self.pen.id]), {'quantity': 5})
+        response = self.client.get(reverse('cart_view'))
+        self.assertEqual(Cart.objects.count(), 0)
+        self.assertEqual(response.context['total_price'], Decimal('50.00'))
+
+    def test_browsing_cart_without_session_creates_nothing(self):
+        self.client.get(reverse('cart_view'))
+        self.assertNotIn('sessionid', self.client.cookies)
+
+    def test_login_merges_into_existing_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.pen, quantity=2)
+        self.client.post(reverse('add_to_cart', args=[self.pen.id]))
+        self.client.post(reverse('add_to_cart', args=[self.ink.id]))
+
+        self.client.post(reverse('login'), {'username': 'asha', 'password': 'pass12345'})
+
+        quantities = dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {self.pen.id: 3, self.ink.id: 1})
+        self.assertNotIn('guest_cart', self.client.session)
+
+
+class CartSummaryTests(StoreTestCase):
+    def setUp(self):
+        Category.objects.create(name='Grocery')
+        self.user = User.objects.create_user('ravi', password='pass12345')
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def fill_cart(self, lines):
+        for i, product in enumerate(make_products(Category.objects.get(), lines, prefix='Item')):
+            CartItem.objects.create(cart=self.cart, product=product, quantity=i + 1)
+
+    def test_summary_totals_come_from_the_database(self):
+        self.fill_cart(3)
+        with self.assertNumQueries(2):
+            summary = self.cart.summary()
+            [item.product.name for item in summary.items]
+        self.assertEqual(summary.subtotal, Decimal('60.00'))
+        self.assertEqual(summary.item_count, 6)
+        self.assertEqual(summary.items[2].line_total, Decimal('30.00'))
+
+    def test_cart_page_query_count_does_not_grow_with_lines(self):
+        self.fill_cart(1)
+        with self.assertNumQueries(4) as small:
+            self.client.get(reverse('cart_view'))
+        self.fill_cart(10)
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.client.get(reverse('cart_view'))
+        self.assertEqual(len(response.context['cart_items']), 11)
+
+    def test_checkout_page_query_count_does_not_grow_with_lines(self):
+        self.fill_cart(1)
+        with self.assertNumQueries(4) as small:
+            self.client.get(reverse('checkout'))
+        self.fill_cart(10)
+        with self.assertNumQueries(len(small.captured_queries)):
+            self.client.get(reverse('checkout'))
+
+
+class PlaceOrderTests(StoreTestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Shoes')
+        self.sneaker, self.boot = make_products(category, 2)
+        self.user = User.objects.create_user('meera', password='pass12345')
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.sneaker, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.boot, quantity=3)
+
+    def test_order_decrements_stock_and_snapshots_prices(self):
+        order = place_order(self.user, self.cart)
+        self.sneaker.refresh_from_db()
+        self.assertEqual(self.sneaker.stock, 3)
+        self.assertEqual(order.total_price, Decimal('50.00'))
+        self.assertEqual(sorted(order.orderitem_set.values_list('quantity', 'price')),
+                         [(2, Decimal('10.00')), (3, Decimal('10.00'))])
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_short_stock_rolls_back_everything(self):
+        Product.objects.filter(id=self.boot.id).update(stock=2)
+        with self.assertRaises(OutOfStockError) as raised:
+            place_order(self.user, self.cart)
+        self.assertEqual(raised.exception.products, [self.boot])
+        self.sneaker.refresh_from_db()
+        self.assertEqual(self.sneaker.stock, 5)
+        self.assertFalse(Order.objects.exists() or OrderItem.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 2)
+
+
+@override_settings(STORE_ORDERS_PER_PAGE=5)
+class OrderHistoryTests(StoreTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Garden')
+        self.user = User.objects.create_user('kiran', password='pass12345')
+        self.client.force_login(self.user)
+
+    def place_orders(self, count):
+        cart = Cart.objects.get_or_create(user=self.user)[0]
+        for product in make_products(self.category, count):
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+            place_order(self.user, cart)
+
+    def test_summary_fields_filled_at_placement(self):
+        self.place_orders(1)
+        order = Order.objects.get()
+        self.assertEqual((order.item_count, order.line_count), (2, 1))
+
+    def test_any_page_renders_with_constant_queries(self):
+        self.place_orders(12)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('order_history'), {'page': 2})
+        self.assertEqual(len(response.context['orders']), 5)
+        self.assertContains(response, 'Page 2 of 3')
+
+
+def image_upload(name='photo.jpg', size=(1200, 900), fmt='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'orange').save(buffer, format=fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class TempMediaMixin:
+    def setUp(self):
+        super().setUp()
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=os.path.join(root, 'media'),
+                                              STORE_UPLOAD_STAGING_ROOT=os.path.join(root, 'staging'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+@override_settings(STORE_IMAGE_WORKERS=0, STORE_IMAGE_WIDTHS=[160, 320])
+class ImageRenditionTests(TempMediaMixin, StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        caches['fragments'].clear()
+        category = Category.objects.create(name='Decor')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product = Product.objects.create(
+                name='Lamp', description='Warm light', price=Decimal('20.00'),
+                category=category, image=image_upload())
+
+    def test_upload_generates_smaller_renditions(self):
+        for fmt in FORMATS:
+            with default_storage.open(derivative_name(self.product.image.name, 160, fmt)) as f:
+                self.assertEqual(Image.open(f).width, 160)
+
+    def test_cards_emit_srcset(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, '-320w.jpg 320w')
+
+    def test_ready_renditions_are_remembered(self):
+        with mock.patch('store.images.derivatives_ready', wraps=derivatives_ready) as ready:
+            first = renditions(self.product.image)
+            self.assertEqual(renditions(self.product.image), first)
+        ready.assert_called_once_with(self.product.image.name)
+
+    def test_failed_job_is_not_rescheduled_until_the_retry_delay(self):
+        queue = DerivativeQueue()
+        job = mock.Mock(side_effect=OSError('cannot identify image file'))
+        with self.assertLogs('store.images', 'ERROR') as logs:
+            queue.schedule('broken.png', job=job)
+            queue.schedule('broken.png', job=job)
+            with override_settings(STORE_IMAGE_RETRY_SECONDS=0):
+                queue.schedule('broken.png', job=job)
+        self.assertEqual(job.call_count, 2)
+        self.assertEqual(len(logs.output), 2)
+
+
+class FileServingTests(StoreTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        with open(os.path.join(self.root, 'app.css'), 'wb') as f:
+            f.write(b'0123456789' * 100)
+        with open(os.path.join(self.root, 'app.css.gz'), 'wb') as f:
+            f.write(b'gzipped')
+        self.factory = RequestFactory()
+
+    def serve(self, precompressed=False, **headers):
+        request = self.factory.get('/static/app.css', headers=headers)
+        return serve_file(request, self.root, 'app.css', 'public, max-age=60', precompressed)
+
+    def test_full_response_and_revalidation(self):
+        response = self.serve()
+        self.assertEqual(response['Content-Length'], '1000')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(self.serve(if_none_match=response['ETag']).status_code, 304)
+
+    def test_range_requests(self):
+        response = self.serve(range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1000')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(self.serve(range='bytes=-5')['Content-Range'], 'bytes 995-999/1000')
+        self.assertEqual(self.serve(range='bytes=2000-').status_code, 416)
+
+    def test_precompressed_variant(self):
+        response = self.serve(precompressed=True, accept_encoding='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(b''.join(response.streaming_content), b'gzipped')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+
+class ConditionalResponseTests(StoreTestCase):
+    def setUp(self):
+        caches['fragments'].clear()
+        self.category = Category.objects.create(name='Music')
+        self.product = make_products(self.category, 1)[0]
+
+    def test_unchanged_product_page_is_304_without_queries(self):
+        url = reverse('product_detail', args=[self.product.id])
+        response = self.client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Accept', response['Vary'])
+        with self.assertNumQueries(0):
+            again = self.client.get(url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('12.00')
+            self.product.save()
+        self.assertEqual(self.client.get(url, headers={'if-none-match': response['ETag']}).status_code, 200)
+
+    def test_product_page_loads_its_category_in_the_same_query(self):
+        self.client.get(reverse('home'))  # warm the category bar
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product_detail', args=[self.product.id]))
+        self.assertContains(response, 'Music')
+
+    def test_product_etag_changes_when_its_category_is_renamed(self):
+        url = reverse('product_detail', args=[self.product.id])
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Audio'
+            self.category.save()
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertContains(response, 'Audio')
+
+    def test_category_etag_changes_when_a_product_moves(self):
+        url = reverse('products_by_category', args=[self.category.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.category = Category.objects.create(name='Film')
+            self.product.save()
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_order_pages_are_private_and_follow_updated_at(self):
+        user = User.objects.create_user('dev', password='pass12345')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.product)
+        order = place_order(user, cart)
+        self.client.force_login(user)
+
+        url = reverse('track_order', args=[order.id])
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, headers={'if-none-match': response['ETag']}).status_code, 304)
+
+        order.status = 'shipped'
+        order.save()
+        self.assertEqual(self.client.get(url, headers={'if-none-match': response['ETag']}).status_code, 200)
+        self.assertIn('private', self.client.get(reverse('product_detail', args=[self.product.id]))['Cache-Control'])
+
+
+@override_settings(STORE_READ_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRoutingTests(StoreTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_catalog_reads_in_catalog_views_use_replicas(self):
+        with replica_reads():
+            self.assertIn(self.router.db_for_read(Product), ['replica_1', 'replica_2'])
+            self.assertEqual(self.router.db_for_read(Cart), 'default')
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_pinned_clients_read_the_primary(self):
+        with replica_reads(), pinned_to_primary():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_writes_make_the_client_sticky(self):
+        response = self.client.post(reverse('add_to_cart', args=[make_products(Category.objects.create(name='X'), 1)[0].id]))
+        self.assertIn('primary_until', response.cookies)
+        self.assertFalse(self.router.allow_migrate('replica_1', 'store'))
+
+
+class SQLiteTuningTests(StoreTestCase):
+    @override_settings(STORE_SQLITE_PRAGMAS={'busy_timeout': 1234, 'cache_size': -2048})
+    def test_pragmas_are_applied_to_new_connections(self):
+        apply_pragmas(sender=None, connection=connection)
+        pragmas = current_pragmas()
+        self.assertEqual(pragmas['busy_timeout'], 1234)
+        self.assertEqual(pragmas['cache_size'], -2048)
+
+    def test_write_queue_hands_over_in_arrival_order(self):
+        queue = WriteQueue()
+        order = []
+
+        def take_turn(i):
+            with queue.writer():
+                order.append(i)
+
+        def wait_for_waiters(count):
+            deadline = time.monotonic() + 5
+            while queue.waiting < count and time.monotonic() < deadline:
+                time.sleep(0.001)
+            self.assertEqual(queue.waiting, count)
+
+        queue.acquire()
+        threads = []
+        for i in range(5):
+            thread = threading.Thread(target=take_turn, args=(i,))
+            thread.start()
+            threads.append(thread)
+            # Start the next thread only once this one is queued behind us
+            wait_for_waiters(i + 1)
+        with queue.writer():  # re-entrant for the owning thread
+            pass
+        queue.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, [0, 1, 2, 3, 4])
+
+    def test_write_queue_admits_one_writer_at_a_time(self):
+        queue = WriteQueue()
+        start = threading.Barrier(8)
+        holders, most = [], []
+
+        def write():
+            start.wait()
+            with queue.writer():
+                holders.append(threading.get_ident())
+                most.append(len(holders))
+                time.sleep(0.001)
+                holders.remove(threading.get_ident())
+
+        threads = [threading.Thread(target=write) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((len(most), max(most), queue.waiting), (8, 1, 0))
+
+
+class BenchmarkHarnessTests(StoreTestCase):
+    def test_seeded_store_has_the_requested_sizes(self):
+        counts = seed_store(categories=3, products=40, users=5, orders=12, carts=2, cart_lines=2)
+        self.assertEqual(counts, {'categories': 3, 'products': 40, 'users': 5, 'orders': 12, 'carts': 2})
+        order = Order.objects.first()
+        self.assertEqual(order.line_count, OrderItem.objects.filter(order=order).count())
+        # bulk_create sends no signals, seed_store indexes the catalog itself
+        self.assertTrue(get_search_backend().search(Product.objects.first().name.split()[0], 5))
+        self.client.login(username='user0', password='benchmark-pass')
+        self.assertEqual(self.client.get(reverse('order_history')).status_code, 200)
+
+    def test_compare_runs_flags_extra_queries_and_slowdowns(self):
+        baseline = {'results': {'home': {'p50_ms': 10.0, 'queries': 2}, 'cart': {'p50_ms': 0.2, 'queries': 5}}}
+        current = {'results': {'home': {'p50_ms': 15.0, 'queries': 3}, 'cart': {'p50_ms': 0.5, 'queries': 5}}}
+        regressions = compare_runs(baseline, current)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(regression.startswith('home') for regression in regressions))
+
+
+class UniquenessConstraintTests(StoreTestCase):
+    def setUp(self):
+        self.product, = make_products(Category.objects.create(name='Pens'), 1)
+        self.user = User.objects.create_user('uma', password='pass12345')
+
+    def test_one_cart_per_user_and_one_line_per_product(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=cart, product=self.product)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user)
+
+    def test_one_order_line_per_product(self):
+        order = Order.objects.create(user=self.user, total_price=Decimal('10.00'))
+        OrderItem.objects.create(order=order, product=self.product, price=Decimal('10.00'))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OrderItem.objects.create(order=order, product=self.product, price=Decimal('10.00'))
+
+
+class DuplicateMergeMigrationTests(TransactionTestCase):
+    """Rows the constraints would reject are merged by the migrations that add them"""
+    databases = '__all__'
+    before = ('store', '0006_order_summary_fields')
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes('store')
+        executor.migrate([self.before])
+        self.addCleanup(lambda: MigrationExecutor(connection).migrate(self.latest))
+        self.apps = executor.loader.project_state([self.before]).apps
+
+    def test_duplicates_are_merged(self):
+        get = self.apps.get_model
+        user = get('auth', 'User').objects.create(username='old')
+        category = get('store', 'Category').objects.create(name='Old')
+        Product = get('store', 'Product')
+        pen = Product.objects.create(name='Pen', description='', price=Decimal('10.00'), category=category)
+        ink = Product.objects.create(name='Ink', description='', price=Decimal('4.00'), category=category)
+        Cart, CartItem = get('store', 'Cart'), get('store', 'CartItem')
+        first, second = Cart.objects.create(user=user), Cart.objects.create(user=user)
+        CartItem.objects.create(cart=first, product=pen, quantity=2)
+        CartItem.objects.create(cart=second, product=pen, quantity=3)
+        CartItem.objects.create(cart=second, product=ink, quantity=1)
+        order = get('store', 'Order').objects.create(user=user, total_price=Decimal('34.00'))
+        OrderItem = get('store', 'OrderItem')
+        OrderItem.objects.create(order=order, product=pen, quantity=1, price=Decimal('10.00'))
+        OrderItem.objects.create(order=order, product=pen, quantity=2, price=Decimal('8.00'))
+        OrderItem.objects.create(order=order, product=ink, quantity=2, price=Decimal('4.00'))
+
+        MigrationExecutor(connection).migrate(self.latest)
+
+        self.assertEqual(list(Cart.objects.values_list('id', flat=True)), [first.id])
+        self.assertEqual(sorted(CartItem.objects.values_list('cart_id', 'product_id', 'quantity')),
+                         sorted([(first.id, pen.id, 5), (first.id, ink.id, 1)]))
+        self.assertEqual(sorted(OrderItem.objects.values_list('product_id', 'quantity', 'price')),
+                         sorted([(pen.id, 3, Decimal('8.67')), (ink.id, 2, Decimal('4.00'))]))
+        self.assertEqual(get('store', 'Order').objects.get().line_count, 2)
+
+
+class QueryPlanAuditTests(StoreTestCase):
+    def setUp(self):
+        caches['fragments'].clear()
+        seed_catalog(300)
+        self.user = seed_shopper()
+
+    def audit(self, allowed):
+        out = io.StringIO()
+        command = AuditQueryPlansCommand(stdout=out)
+        return command.audit('default', connection.vendor, self.user, allowed), out.getvalue()
+
+    def test_every_page_reads_through_indexes(self):
+        flagged, report = self.audit({'store_category'})
+        self.assertEqual(flagged, 0, report)
+        for page in ('home [200]', 'order_history [200]', 'cart_view [200]', 'track_order [200]'):
+            self.assertIn(page, report)
+
+    def test_full_scans_are_reported(self):
+        # The category bar reads the whole (small) table, which the default --allow accepts
+        flagged, report = self.audit(set())
+        self.assertGreater(flagged, 0)
+        self.assertIn('store_category', report)
+
+
+@override_settings(STORE_INSTRUMENTATION=True)
+class InstrumentationTests(StoreTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.category = Category.objects.create(name='Books')
+        make_products(self.category, 3)
+
+    def test_server_timing_and_metrics_per_url_name(self):
+        response = self.client.get(reverse('home'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries, 0 duplicate"')
+        self.assertIn('tpl;dur=', timing)
+
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('store_request_duration_seconds_count{view="home"} 1', body)
+        self.assertIn('store_db_queries_total{view="home"}', body)
+
+    @override_settings(ROOT_URLCONF='ecommerce.asgi_urls')
+    async def test_async_views_are_measured_too(self):
+        response = await self.async_client.get(reverse('home'))
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries')
+
+    def test_duplicate_queries_are_counted(self):
+        stats = RequestStats()
+        execute = lambda sql, params, many, context: None
+        for params in [(1,), (1,), (2,)]:
+            stats.record(execute, 'SELECT 1 WHERE id = %s', params, False, {})
+        self.assertEqual((stats.queries, stats.duplicates), (3, 1))
+
+    def test_metrics_are_local_only(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.9').status_code, 403)
+        with override_settings(STORE_INSTRUMENTATION=False):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+
+@override_settings(ROOT_URLCONF='ecommerce.asgi_urls',
+                   STORE_SEARCH={'BACKEND': 'store.search.IContainsSearchBackend'})
+class AsyncViewTests(StoreTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Books')
+        self.products = make_products(self.category, 3)
+        self.user = User.objects.create_user('dev', password='pass12345')
+
+    async def test_catalog_pages(self):
+        self.assertTrue(iscoroutinefunction(resolve(reverse('home')).func))
+        response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, 'Product 2')
+        self.assertIn('public', response['Cache-Control'])
+        data = (await self.async_client.get(reverse('home'), {'format': 'json'})).json()
+        self.assertEqual(len(data['results']), 3)
+
+        response = await self.async_client.get(reverse('product_detail', args=[self.products[0].id]))
+        self.assertContains(response, 'Books')
+        self.assertEqual((await self.async_client.get(reverse('product_detail', args=[0]))).status_code, 404)
+        self.assertContains(await self.async_client.get(reverse('search_products'), {'q': 'Product 1'}), 'Product 1')
+
+    async def test_cart_for_guests_and_users(self):
+        await self.async_client.post(reverse('add_to_cart', args=[self.products[0].id]))
+        response = await self.async_client.get(reverse('cart_view'))
+        self.assertEqual(response.context['item_count'], 1)
+
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.post(reverse('add_to_cart', args=[self.products[1].id]))
+        response = await self.async_client.get(reverse('cart_view'))
+        # The guest line was merged into the user's cart at login
+        self.assertEqual(response.context['item_count'], 2)
+        self.assertEqual(response.context['total_price'], Decimal('20.00'))
+        self.assertIn('private', (await self.async_client.get(reverse('home')))['Cache-Control'])
+
+
+@override_settings(STORE_PAGE_SIZE=5, STORE_SEARCH={'BACKEND': 'store.search.IContainsSearchBackend'})
+class JsonApiTests(StoreTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Toys')
+        self.products = make_products(self.category, 12)
+        self.user = User.objects.create_user('neha', password='pass12345')
+
+    def add_items(self, items, method='post'):
+        return getattr(self.client, method)(reverse('api_cart_items'), {'items': items},
+                                            content_type='application/json')
+
+    def test_sparse_fields_and_cursor_pages(self):
+        data = self.client.get(reverse('api_products'), {'fields': 'id,name'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'name'})
+        seen = [item['id'] for item in data['results']]
+        while data['next_cursor']:
+            data = self.client.get(reverse('api_products'), {'fields': 'id', 'cursor': data['next_cursor']}).json()
+            seen += [item['id'] for item in data['results']]
+        self.assertEqual(sorted(seen), sorted(product.id for product in self.products))
+
+        response = self.client.get(reverse('api_products'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_search_within_a_category_fills_its_pages(self):
+        # Newer, better ranked matches in another category come first in the index
+        make_products(Category.objects.create(name='Books'), 12)
+        params = {'q': 'Product', 'category': self.category.id, 'limit': 5, 'fields': 'id'}
+        pages = [self.client.get(reverse('api_products'), params).json()]
+        while pages[-1]['next_cursor']:
+            pages.append(self.client.get(reverse('api_products'), {**params, 'cursor': pages[-1]['next_cursor']}).json())
+        self.assertEqual([len(page['results']) for page in pages], [5, 5, 2])
+        self.assertEqual(sorted(item['id'] for page in pages for item in page['results']),
+                         sorted(product.id for product in self.products))
+
+    def test_listing_etag_changes_when_an_order_takes_stock(self):
+        url = reverse('api_products')
+        params = {'fields': 'id,stock', 'category': self.category.id, 'limit': 20}
+        response = self.client.get(url, params)
+        self.assertEqual(self.client.get(url, params, headers={'if-none-match': response['ETag']}).status_code, 304)
+
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.user, cart)
+        again = self.client.get(url, params, headers={'if-none-match': response['ETag']})
+        self.assertEqual(again.status_code, 200)
+        stock = {item['id']: item['stock'] for item in again.json()['results']}
+        self.assertEqual(stock[self.products[0].id], self.products[0].stock - 2)
+
+    def test_field_selection_limits_columns_and_joins(self):
+        with self.assertNumQueries(1) as queries:
+            self.client.get(reverse('api_products'), {'fields': 'id,name'})
+        sql = queries.captured_queries[0]['sql']
+        self.assertNotIn('description', sql)
+        self.assertNotIn('JOIN', sql)
+        with self.assertNumQueries(1) as queries:
+            data = self.client.get(reverse('api_products'), {'fields': 'name,category', 'limit': 20}).json()
+        self.assertIn('JOIN', queries.captured_queries[0]['sql'])
+        self.assertEqual(len(data['results']), 12)
+        self.assertEqual(data['results'][0]['category']['name'], 'Toys')
+
+    def test_payload_is_smaller_than_the_page(self):
+        html = self.client.get(reverse('home'))
+        data = self.client.get(reverse('api_products'))
+        self.assertLess(len(data.content) * 3, len(html.content))
+
+    def test_batch_add_in_constant_queries(self):
+        self.client.force_login(self.user)
+        Cart.objects.create(user=self.user)
+        self.add_items([{'product_id': self.products[0].id, 'quantity': 1}])
+
+        with self.assertNumQueries(11) as small:
+            self.add_items([{'product_id': self.products[0].id, 'quantity': 2},
+                            {'product_id': self.products[1].id, 'quantity': 1}])
+        items = [{'product_id': product.id, 'quantity': 1} for product in self.products]
+        with self.assertNumQueries(len(small.captured_queries)):
+            data = self.add_items(items).json()
+        self.assertEqual(data['item_count'], 16)
+        self.assertEqual(data['subtotal'], '160.00')
+
+        data = self.add_items([{'product_id': self.products[0].id, 'quantity': 0}], method='put').json()
+        self.assertEqual(len(data['items']), 11)
+
+    def test_batch_is_rejected_as_a_whole(self):
+        response = self.add_items([{'product_id': self.products[0].id, 'quantity': 1},
+                                   {'product_id': 0, 'quantity': 1}])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_cart')).json()['item_count'], 0)
+        self.assertEqual(self.client.get(reverse('api_cart_items')).status_code, 405)
+
+        # Guests get the session cart, nothing is written to the database
+        self.add_items([{'product_id': self.products[0].id, 'quantity': 2}])
+        self.assertEqual(self.client.get(reverse('api_cart')).json()['item_count'], 2)
+        self.assertEqual(Cart.objects.count(), 0)
+
+    def test_orders_need_login_and_embed_items(self):
+        self.assertEqual(self.client.get(reverse('api_orders')).status_code, 401)
+        self.client.force_login(self.user)
+        cart = Cart.objects.create(user=self.user)
+        for product in self.products[:7]:
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+            place_order(self.user, cart)
+
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse('api_orders'), {'fields': 'id,total_price,items'}).json()
+        self.assertEqual(len(data['results']), 5)
+        self.assertEqual(data['results'][0]['items'][0]['quantity'], 2)
+        order_id = data['results'][0]['id']
+        self.assertEqual(self.client.get(reverse('api_order', args=[order_id])).json()['total_price'], '20.00')
+        self.assertEqual(self.client.get(reverse('api_order', args=[0])).status_code, 404)
+
+
+CATALOG_CSV = """sku,name,description,price,stock,category,image_url
+A-1,Kite,Flies well,12.50,4,Outdoor,
+A-2,Ball,Bounces,3,10,Outdoor,http://images.example/ball.png
+A-3,Puzzle,,not-a-price,1,Games,
+A-4,Chess,Classic,20.00,2,Games,
+"""
+
+
+def png_response():
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 40), 'red').save(buffer, format='PNG')
+    buffer.seek(0)
+    return buffer
+
+
+@override_settings(STORE_SEARCH={'BACKEND': 'store.search.IContainsSearchBackend'})
+class CatalogImportTests(TempMediaMixin, StoreTestCase):
+    def run_import(self, text, fmt='csv', **kwargs):
+        importer = CatalogImporter(workers=2, **kwargs)
+        with mock.patch('store.catalog_io.urllib.request.urlopen', side_effect=lambda *a, **k: png_response()):
+            importer.run(read_rows(io.StringIO(text), fmt))
+        return importer
+
+    def test_upsert_on_sku(self):
+        Category.objects.create(name='Outdoor')
+        importer = self.run_import(CATALOG_CSV)
+        self.assertEqual(importer.stats, {'rows': 4, 'created': 3, 'updated': 0, 'images': 1, 'skipped': 1})
+        self.assertIn('line 4', importer.errors[0])
+        self.assertEqual(Category.objects.count(), 2)
+        self.assertTrue(Product.objects.get(sku='A-2').image.name.startswith('products/A-2'))
+
+        importer = self.run_import('sku,name,price,category\nA-1,Kite XL,15.00,Games\n')
+        self.assertEqual((importer.stats['created'], importer.stats['updated']), (0, 1))
+        kite = Product.objects.get(sku='A-1')
+        self.assertEqual((kite.name, kite.price, kite.category.name), ('Kite XL', Decimal('15.00'), 'Games'))
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_queries_per_chunk_do_not_grow_with_rows(self):
+        Category.objects.create(name='C')
+        def rows(count):
+            return 'sku,name,price,category\n' + ''.join(f'S{i},P{i},1.00,C\n' for i in range(count))
+
+        with self.assertNumQueries(6) as small:
+            self.run_import(rows(5), images=False)
+        with self.assertNumQueries(len(small.captured_queries)):
+            self.run_import(rows(100), images=False)
+
+    def test_export_round_trip(self):
+        self.run_import(CATALOG_CSV)
+        exported = ''.join(format_rows(export_rows(Product.objects.all()), 'jsonl'))
+        self.assertEqual(len(exported.splitlines()), 3)
+        Product.objects.update(price=Decimal('1.00'))
+        importer = self.run_import(exported, fmt='jsonl')
+        self.assertEqual(importer.stats['updated'], 3)
+        self.assertEqual(Product.objects.get(sku='A-4').price, Decimal('20.00'))
+
+    def test_admin_import_and_export(self):
+        admin = User.objects.create_superuser('admin', password='pass12345')
+        self.client.force_login(admin)
+        upload = SimpleUploadedFile('products.csv', CATALOG_CSV.encode())
+        response = self.client.post(reverse('admin:store_product_import'), {'file': upload})
+        self.assertRedirects(response, reverse('admin:store_product_changelist'))
+        self.assertEqual(Product.objects.count(), 3)
+
+        response = self.client.post(reverse('admin:store_product_changelist'), {
+            'action': 'export_csv', '_selected_action': list(Product.objects.values_list('id', flat=True)),
+        })
+        self.assertEqual(b''.join(response.streaming_content).decode().count('\n'), 4)
+
+
+class SalesRollupTests(StoreTestCase):
+    def setUp(self):
+        self.toys = Category.objects.create(name='Toys')
+        self.games = Category.objects.create(name='Games')
+        self.kite, = make_products(self.toys, 1, prefix='Kite')
+        self.chess, = make_products(self.games, 1, prefix='Chess')
+        self.user = User.objects.create_user('tara', password='pass12345')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def order(self, *lines):
+        for product, quantity in lines:
+            CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+        return place_order(self.user, self.cart)
+
+    def snapshot(self):
+        return {
+            model.__name__: sorted(model.objects.filter(orders__gt=0).values_list(*fields, 'orders', 'units', 'revenue'))
+            for model, fields in [(DailySales, ['status']), (DailyProductSales, ['product_id', 'category_id', 'status']),
+                                  (DailyCategorySales, ['category_id', 'status'])]
+        }
+
+    def test_placement_and_status_changes(self):
+        self.order((self.kite, 2), (self.chess, 1))
+        second = self.order((self.kite, 1))
+        self.assertEqual(DailySales.objects.values_list('orders', 'units', 'revenue').get(),
+                         (2, 4, Decimal('40.00')))
+        self.assertEqual(DailyProductSales.objects.values_list('orders', 'units').get(product=self.kite), (2, 3))
+
+        second.status = 'cancelled'
+        second.save()
+        rows = dict(DailySales.objects.values_list('status', 'orders'))
+        self.assertEqual(rows, {'pending': 1, 'cancelled': 1})
+        self.assertEqual(DailyCategorySales.objects.get(category=self.toys, status='pending').units, 2)
+
+        incremental = self.snapshot()
+        rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+        second.delete()
+        self.assertFalse(DailySales.objects.filter(status='cancelled', orders__gt=0).exists())
+
+    def test_dashboard_reads_only_rollups(self):
+        self.order((self.kite, 2), (self.chess, 1))
+        self.client.force_login(User.objects.create_superuser('boss', password='pass12345'))
+        with self.assertNumQueries(6) as queries:
+            response = self.client.get(reverse('admin:store_dailysales_changelist'), {'days': 7})
+        self.assertContains(response, 'Kite 0')
+        self.assertContains(response, '₹30.00')
+        self.assertFalse(any('store_orderitem' in query['sql'] for query in queries.captured_queries))
+
+
+class GuestDataReaperTests(StoreTestCase):
+    def setUp(self):
+        self.product, = make_products(Category.objects.create(name='Misc'), 1)
+        self.old = timezone.now() - timedelta(days=60)
+        for i in range(5):
+            cart = Cart.objects.create(session_key=f'guest{i}')
+            CartItem.objects.create(cart=cart, product=self.product)
+        Cart.objects.update(updated_at=self.old)
+        self.fresh = Cart.objects.create(session_key='fresh')
+        self.user_cart = Cart.objects.create(user=User.objects.create_user('old', password='pass12345'))
+        Cart.objects.filter(id=self.user_cart.id).update(updated_at=self.old)
+
+    def test_dry_run_only_counts(self):
+        report = reap_guest_carts(timezone.now() - timedelta(days=30), dry_run=True)
+        self.assertEqual((report['carts'], report['items']), (5, 5))
+        self.assertEqual(Cart.objects.count(), 7)
+
+    def test_batches_delete_abandoned_guest_carts(self):
+        with mock.patch('store.reaper.time.sleep') as sleep:
+            report = reap_guest_carts(timezone.now() - timedelta(days=30), batch_size=2, pause=0.5)
+        self.assertEqual((report['carts'], report['items']), (5, 5))
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(set(Cart.objects.values_list('id', flat=True)), {self.fresh.id, self.user_cart.id})
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_expired_sessions(self):
+        for i in range(3):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=self.old)
+        Session.objects.create(session_key='live', session_data='', expire_date=timezone.now() + timedelta(days=1))
+        self.assertEqual(reap_sessions(batch_size=2, pause=0)['sessions'], 3)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+
+
+class SessionEngineTests(StoreTestCase):
+    def setUp(self):
+        self.product, = make_products(Category.objects.create(name='Bags'), 1)
+
+    def session_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(path)
+        return [query['sql'] for query in queries if 'django_session' in query['sql']]
+
+    def test_guest_browsing_reads_sessions_from_the_cache(self):
+        self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        self.assertEqual(self.session_queries(reverse('home')), [])
+        self.assertEqual(self.session_queries(reverse('cart_view')), [])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_database_sessions_read_the_table(self):
+        self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        self.assertEqual(len(self.session_queries(reverse('home'))), 1)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+                       CACHES={'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_process_local_session_cache_is_flagged(self):
+        self.assertEqual([warning.id for warning in check_session_cache(None)], ['store.W001'])
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            self.assertEqual(check_session_cache(None), [])
+
+    def test_unchanged_cart_is_not_saved(self):
+        self.client.post(reverse('add_to_cart', args=[self.product.id]))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('update_cart_quantity', args=[self.product.id]), {'quantity': 1})
+        self.assertFalse(any('django_session' in query['sql'] for query in queries))
+
+
+class ProfileBackendTests(StoreTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ira', password='pass12345')
+        self.client.force_login(self.user)
+
+    def test_profile_created_with_the_account(self):
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+
+    def test_user_and_profile_load_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['profile'].user_id, self.user.id)
+        user_queries = [query['sql'] for query in queries
+                        if 'auth_user' in query['sql'] or 'store_userprofile' in query['sql']]
+        self.assertEqual(len(user_queries), 1)
+        self.assertIn('JOIN "store_userprofile"', user_queries[0])
+
+    def test_user_changes_reach_the_next_request(self):
+        self.client.get(reverse('profile'))
+        self.user.first_name = 'Iravati'
+        self.user.save()
+        self.assertContains(self.client.get(reverse('profile')), 'Iravati')
+        self.user.set_password('changed-pass')
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 302)
+
+    def test_deactivated_user_is_signed_out(self):
+        self.client.get(reverse('profile'))
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 302)
+
+
+@override_settings(STORE_IMAGE_WORKERS=0, STORE_IMAGE_WIDTHS=[160], STORE_PROFILE_PICTURE_SIZE=256)
+class ProfilePictureUploadTests(TempMediaMixin, StoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('noor', password='pass12345')
+        self.client.force_login(self.user)
+
+    def upload(self, upload):
+        return self.client.post(reverse('upload_photo'), {'profile_picture': upload})
+
+    def test_upload_is_resized_and_stripped_off_the_request(self):
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x010f] = 'PhoneMaker'
+        Image.new('RGBA', (1600, 800), (0, 128, 0, 0)).save(buffer, format='PNG', exif=exif)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.upload(SimpleUploadedFile('me.png', buffer.getvalue()))
+        self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertTrue(profile.pending_picture)
+        self.assertFalse(profile.profile_picture)
+
+        for callback in callbacks:
+            callback()
+        profile.refresh_from_db()
+        self.assertEqual(profile.pending_picture, '')
+        with default_storage.open(profile.profile_picture.name) as f:
+            image = Image.open(f)
+            self.assertEqual((image.format, image.size, image.mode), ('JPEG', (256, 128), 'RGB'))
+            self.assertFalse(image.getexif())
+        self.assertFalse(staging_storage().listdir('')[1])
+
+    def test_staged_upload_is_not_under_media_root(self):
+        with mock.patch('store.uploads.derivative_queue.schedule'):
+            self.upload(image_upload())
+        staged = UserProfile.objects.get(user=self.user).pending_picture
+        self.assertTrue(staging_storage().exists(staged))
+        self.assertFalse(default_storage.exists(staged))
+
+    def test_processing_failure_is_shown_on_the_profile(self):
+        with mock.patch('store.uploads.reencode', side_effect=OSError('truncated')), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.upload(image_upload())
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.pending_picture, profile.picture_error), ('', PROCESSING_FAILED))
+        self.assertFalse(staging_storage().listdir('')[1])
+        self.assertContains(self.client.get(reverse('profile')), 'We could not process that photo')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(image_upload())
+        self.assertEqual(UserProfile.objects.get(user=self.user).picture_error, '')
+
+    def test_placeholder_until_processed(self):
+        with mock.patch('store.uploads.derivative_queue.schedule'):
+            self.upload(image_upload())
+            response = self.client.get(reverse('profile'))
+        self.assertContains(response, 'Processing your photo')
+        self.assertContains(response, 'http-equiv="refresh"')
+
+    def test_replaced_picture_is_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(image_upload())
+        first = UserProfile.objects.get(user=self.user).profile_picture.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(image_upload(name='again.jpg'))
+        second = UserProfile.objects.get(user=self.user).profile_picture.name
+        self.assertNotEqual(first, second)
+        self.assertFalse(default_storage.exists(first))
+        self.assertTrue(default_storage.exists(second))
+
+    def test_rejects_files_that_are_not_images(self):
+        response = self.upload(SimpleUploadedFile('me.jpg', b'<?php echo 1; ?>' * 10))
+        self.assertContains(response, 'Upload a JPEG, PNG, GIF or WebP image.')
+        response = self.upload(SimpleUploadedFile('me.jpg', b'\xff\xd8\xff\xe0' + b'\0' * 50))
+        self.assertContains(response, 'damaged')
+        self.assertEqual(UserProfile.objects.get(user=self.user).pending_picture, '')
+
+    @override_settings(STORE_PROFILE_PICTURE_MAX_BYTES=1024)
+    def test_rejects_large_files_while_streaming(self):
+        response = self.upload(image_upload(size=(400, 400)))
+        self.assertContains(response, 'at most')
+        self.assertFalse(os.path.exists(settings.STORE_UPLOAD_STAGING_ROOT))
+
+
+class NotificationOutboxTests(StoreTestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Bags')
+        self.tote, = make_products(category, 1, prefix='Tote')
+        self.user = User.objects.create_user('zoya', email='zoya@example.com', password='pass12345')
+        self.cart = Cart.objects.create(user=self.user)
+
+    def order(self):
+        CartItem.objects.create(cart=self.cart, product=self.tote, quantity=1)
+        return place_order(self.user, self.cart)
+
+    def test_order_events_are_queued_and_delivered_off_the_request(self):
+        order = self.order()
+        # As the admin's order form does
+        order.status = 'shipped'
+        order.save()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(list(Notification.objects.values_list('kind', 'status')),
+                         [('order_placed', 'pending'), ('order_status', 'pending')])
+
+        self.assertEqual(deliver_batch(), {'sent': 2, 'retried': 0, 'failed': 0})
+        self.assertEqual([message.subject for message in mail.outbox], [
+            f'Your ShopKart order #{order.id} is confirmed',
+            f'Your ShopKart order #{order.id} is now Shipped',
+        ])
+        self.assertIn('from Pending to Shipped', mail.outbox[1].body)
+        self.assertIn(reverse('track_order', args=[order.id]), mail.outbox[1].body)
+        self.assertEqual(deliver_batch(), {'sent': 0, 'retried': 0, 'failed': 0})
+
+    @override_settings(STORE_NOTIFICATION_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        self.order()
+        with mock.patch('store.notifications.EmailMessage.send', side_effect=OSError('mail server down')):
+            self.assertEqual(deliver_batch(), {'sent': 0, 'retried': 1, 'failed': 0})
+            notification = Notification.objects.get()
+            self.assertGreater(notification.next_attempt_at, timezone.now())
+            self.assertIn('mail server down', notification.last_error)
+            # Not due again until the backoff has passed
+            self.assertEqual(deliver_batch()['retried'], 0)
+            Notification.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(deliver_batch(), {'sent': 0, 'retried': 0, 'failed': 1})
+        self.assertEqual(Notification.objects.get().status, 'failed')
+        self.assertEqual(mail.outbox, [])
+
+    def test_claimed_rows_are_not_taken_twice(self):
+        self.order()
+        self.assertEqual(len(claim_batch(10)), 1)
+        self.assertEqual(claim_batch(10), [])
+
+    def test_users_without_email_get_no_notifications(self):
+        self.user.email = ''
+        self.order()
+        self.assertFalse(Notification.objects.exists())
+
+    def test_worker_command_delivers_in_batches(self):
+        for _ in range(3):
+            self.order()
+        out = io.StringIO()
+        call_command('send_notifications', '--once', '--batch-size', '2', stdout=out)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('3 sent', out.getvalue())
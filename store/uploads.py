@@ -0,0 +1,139 @@
+import logging
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .images import SAVE_OPTIONS, delete_image, derivative_queue
+from .models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+# Profile picture uploads. The request streams the file to a temp file, checks
+# its header and moves it to the private staging directory; a worker thread
+# then resizes, strips and re-encodes it into media storage and swaps it in.
+# Until then the profile page shows a placeholder, and an error if it failed.
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+]
+# Larger images are refused before anything is decoded
+MAX_PIXELS = 40_000_000
+# Shown on the profile when a worker could not use an upload that passed the checks
+PROCESSING_FAILED = 'We could not process that photo. Please try a different image.'
+
+
+def staging_storage():
+    # Outside MEDIA_ROOT: unprocessed uploads are never served
+    return FileSystemStorage(location=settings.STORE_UPLOAD_STAGING_ROOT)
+
+
+def max_upload_bytes():
+    return getattr(settings, 'STORE_PROFILE_PICTURE_MAX_BYTES', 10 * 1024 * 1024)
+
+
+class ProfilePictureUploadHandler(TemporaryFileUploadHandler):
+    """Streams an upload to a temp file and drops it once it passes the size limit"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_upload_bytes():
+            # The parser closes (and so deletes) the temp file and skips the rest of it
+            self.request.upload_too_large = True
+            raise SkipFile
+        return super().receive_data_chunk(raw_data, start)
+
+
+def sniff_image(upload):
+    """(format, (width, height)) read from the file header only; raises ValueError"""
+    upload.seek(0)
+    head = upload.read(16)
+    upload.seek(0)
+    fmt = next((fmt for magic, fmt in SIGNATURES if head.startswith(magic)), None)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        fmt = 'WEBP'
+    if fmt is None:
+        raise ValueError('Upload a JPEG, PNG, GIF or WebP image.')
+    try:
+        # Image.open parses the header; pixel data is only decoded on load()
+        with Image.open(upload) as image:
+            actual, size = image.format, image.size
+    except (OSError, Image.DecompressionBombError):
+        raise ValueError('This image file is damaged.')
+    finally:
+        upload.seek(0)
+    if actual != fmt:
+        raise ValueError('This image file is damaged.')
+    if size[0] * size[1] > MAX_PIXELS:
+        raise ValueError('This image has too many pixels.')
+    return fmt, size
+
+
+def reencode(name, size):
+    """JPEG bytes of a staged image scaled to fit size x size, without its metadata"""
+    with staging_storage().open(name) as source:
+        image = Image.open(source)
+        # JPEGs decode straight at a fraction of their full size
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+    if image.mode != 'RGB':
+        # Transparent areas become white, as JPEG has no alpha
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', rgba.size, 'white')
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    buffer = BytesIO()
+    # No exif= is passed, so location and camera data are not written back
+    image.save(buffer, format='JPEG', **SAVE_OPTIONS['jpeg'])
+    return buffer.getvalue()
+
+
+def process_profile_picture(profile_id, staged):
+    """Worker job: turn a staged upload into the profile's picture, then clean up"""
+    name = None
+    try:
+        data = reencode(staged, getattr(settings, 'STORE_PROFILE_PICTURE_SIZE', 512))
+        name = default_storage.save(f'profile_pics/{profile_id}-{uuid.uuid4().hex[:8]}.jpg', ContentFile(data))
+    except Exception:
+        logger.exception('Could not process profile picture %s', staged)
+
+    with transaction.atomic():
+        profile = UserProfile.objects.select_for_update().filter(pk=profile_id, pending_picture=staged).first()
+        if profile is None:
+            # A newer upload replaced this one while it was processing
+            obsolete = name
+        else:
+            obsolete = profile.profile_picture.name if name else None
+            if name:
+                profile.profile_picture = name
+            profile.pending_picture = ''
+            profile.picture_error = '' if name else PROCESSING_FAILED
+            profile.save(update_fields=['profile_picture', 'pending_picture', 'picture_error'])
+    if obsolete:
+        delete_image(obsolete)
+    staging_storage().delete(staged)
+
+
+def schedule_profile_picture(profile):
+    profile_id, staged = profile.id, profile.pending_picture
+    derivative_queue.schedule(staged, job=lambda name: process_profile_picture(profile_id, name))
+
+
+def stage_profile_picture(profile, upload):
+    """Move a checked upload into storage as the pending picture and queue its processing"""
+    # The temp file is moved, not copied, by the file system storage
+    profile.pending_picture = staging_storage().save(f'{profile.id}-{uuid.uuid4().hex}', upload)
+    profile.picture_error = ''
+    profile.save(update_fields=['pending_picture', 'picture_error'])
+    transaction.on_commit(lambda: schedule_profile_picture(profile))
@@ -6,6 +6,7 @@ urlpatterns = [
     path('product/<int:product_id>/', views.product_detail, name='product_detail'),
     path('category/<int:category_id>/', views.products_by_category, name='products_by_category'),
     path('search/', views.search_products, name='search_products'),
+    path('search/suggest/', views.search_suggest, name='search_suggest'),
     path('signup/', views.signup, name='signup'),
     path('profile/', views.profile, name='profile'),
     path('edit-profile/', views.edit_profile, name='edit_profile'),
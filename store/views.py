@@ -2,44 +2,76 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
-from .models import Product, Category, UserProfile, Cart, CartItem
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import condition
+from .models import Product, Cart, CartItem
 from .forms import UserEditForm, ProfilePictureForm
+from .pagination import paginate_products, page_as_json
+from .search import search_page
+from .suggest import suggestion_index
+from .cache import attach_card_fragments, cached_categories
+from .guest_cart import GuestCart
+from .routers import read_from_replica
+from .sqlite import serialize_writes
+from .auth import profile_for
+from .uploads import ProfilePictureUploadHandler, schedule_profile_picture, stage_profile_picture
+from .conditional import (catalog_cache, private_cache, listing_etag, product_etag,
+                          category_etag, order_etag, order_last_modified)
 
 # Helper function for cart (NEW)
 def get_or_create_cart(request):
-    """Get cart for logged-in user or create for guest"""
+    """Get cart for logged-in user, guests get a session-only GuestCart"""
     if request.user.is_authenticated:
         cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        # Guest user - use session
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.create()
-            session_key = request.session.session_key
-        cart, created = Cart.objects.get_or_create(session_key=session_key, user=None)
-    return cart
+        return cart
+    # Guest user - lines live in the session until login
+    return GuestCart(request)
+
+# Helper for catalog listings - infinite scroll clients ask for JSON
+def wants_json(request):
+    return (request.GET.get('format') == 'json'
+            or 'application/json' in request.headers.get('Accept', ''))
 
 # Home Page View - Product listings with categories
+@catalog_cache
+@condition(etag_func=listing_etag)
+@read_from_replica
 def home(request):
-    products = Product.objects.all()
-    categories = Category.objects.all()
+    products = paginate_products(Product.objects.all(), request.GET.get('cursor'))
+    if wants_json(request):
+        return JsonResponse(page_as_json(products))
+    attach_card_fragments(products)
+    categories = cached_categories()
     return render(request, 'home.html', {
         'products': products,
         'categories': categories
     })
 
 # Product Details Page
+@catalog_cache
+@condition(etag_func=product_etag)
+@read_from_replica
 def product_detail(request, product_id):
-    product = get_object_or_404(Product, id=product_id)
+    product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
     return render(request, 'product_detail.html', {
         'product': product
     })
 
 # Products by Category
+@catalog_cache
+@condition(etag_func=category_etag)
+@read_from_replica
 def products_by_category(request, category_id):
-    category = get_object_or_404(Category, id=category_id)
-    products = Product.objects.filter(category=category)
-    categories = Category.objects.all()
+    categories = cached_categories()
+    category = next((c for c in categories if c['id'] == category_id), None)
+    if category is None:
+        raise Http404('No Category matches the given query.')
+    products = paginate_products(Product.objects.filter(category_id=category_id), request.GET.get('cursor'))
+    if wants_json(request):
+        return JsonResponse(page_as_json(products))
+    attach_card_fragments(products)
     return render(request, 'products.html', {
         'products': products,
         'categories': categories,
@@ -47,16 +79,36 @@ def products_by_category(request, category_id):
     })
 
 # Search Products
+@catalog_cache
+@condition(etag_func=listing_etag)
+@read_from_replica
 def search_products(request):
     query = request.GET.get('q', '')
-    products = Product.objects.filter(name__icontains=query) if query else Product.objects.all()
-    categories = Category.objects.all()
+    if query:
+        products = search_page(query, request.GET.get('cursor'))
+    else:
+        products = paginate_products(Product.objects.all(), request.GET.get('cursor'))
+    if wants_json(request):
+        return JsonResponse(page_as_json(products))
+    attach_card_fragments(products)
+    categories = cached_categories()
     return render(request, 'products.html', {
         'products': products,
         'categories': categories,
         'query': query
     })
 
+# Search Suggestions - typeahead JSON for the search box
+def search_suggest(request):
+    query = request.GET.get('q', '')
+    suggestions = suggestion_index.suggest(query)
+    for suggestion in suggestions:
+        if suggestion['type'] == 'category':
+            suggestion['url'] = reverse('products_by_category', args=[suggestion['id']])
+        else:
+            suggestion['url'] = reverse('product_detail', args=[suggestion['id']])
+    return JsonResponse({'query': query, 'suggestions': suggestions})
+
 # User Registration - SIGNUP
 def signup(request):
     if request.method == 'POST':
@@ -72,8 +124,11 @@ def signup(request):
 # User Profile - PROFILE
 @login_required
 def profile(request):
-    # Create profile if doesn't exist
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    # Created with the account and loaded with request.user, so no query here
+    profile = profile_for(request.user)
+    if profile.pending_picture:
+        # Normally already in flight; picks the upload up again if a worker was restarted
+        schedule_profile_picture(profile)
     return render(request, 'registration/profile.html', {
         'user': request.user,
         'profile': profile
@@ -91,27 +146,40 @@ def edit_profile(request):
         form = UserEditForm(instance=request.user)
     return render(request, 'registration/edit_profile.html', {'form': form})
 
-# Upload Profile Picture
+# Upload Profile Picture - streamed to a temp file, checked from its header and
+# handed to the image workers, so the response does not wait for the resize
 @login_required
+@csrf_exempt
 def upload_profile_picture(request):
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    # Upload handlers can only be swapped before the CSRF check reads the body
+    request.upload_handlers = [ProfilePictureUploadHandler(request)]
+    return _upload_profile_picture(request)
+
+@csrf_protect
+def _upload_profile_picture(request):
+    profile = profile_for(request.user)
     
     if request.method == 'POST':
-        form = ProfilePictureForm(request.POST, request.FILES, instance=profile)
+        form = ProfilePictureForm(request.POST, request.FILES,
+                                  too_large=getattr(request, 'upload_too_large', False))
         if form.is_valid():
-            form.save()
+            stage_profile_picture(profile, form.cleaned_data['profile_picture'])
             return redirect('profile')
     else:
-        form = ProfilePictureForm(instance=profile)
+        form = ProfilePictureForm()
     
     return render(request, 'registration/upload_photo.html', {'form': form})
 
 # Add to Cart Function (UPDATED for guest users)
+@serialize_writes
 def add_to_cart(request, product_id):
     product = get_object_or_404(Product, id=product_id)
     
     # Get or create cart for user (guest or logged-in)
     cart = get_or_create_cart(request)
+    if isinstance(cart, GuestCart):
+        cart.add(product.id)
+        return redirect('cart_view')
     
     # Get or create cart item
     cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
@@ -124,27 +192,35 @@ def add_to_cart(request, product_id):
 
 # Cart View Page (UPDATED for guest users)
 def cart_view(request):
-    cart = get_or_create_cart(request)
-    cart_items = CartItem.objects.filter(cart=cart)
-    
-    total_price = sum(item.get_total_price() for item in cart_items)
+    summary = get_or_create_cart(request).summary()
     
     return render(request, 'cart/cart.html', {
-        'cart_items': cart_items,
-        'total_price': total_price,
+        'cart_items': summary.items,
+        'total_price': summary.subtotal,
+        'item_count': summary.item_count,
         'user': request.user  # Add user context for template
     })
 
 # Remove from Cart (UPDATED for guest users)
+@serialize_writes
 def remove_from_cart(request, item_id):
     cart = get_or_create_cart(request)
+    if isinstance(cart, GuestCart):
+        # Guest lines are addressed by product id
+        cart.remove(item_id)
+        return redirect('cart_view')
     cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
     cart_item.delete()
     return redirect('cart_view')
 
 # Update Cart Quantity (UPDATED for guest users)
+@serialize_writes
 def update_cart_quantity(request, item_id):
     cart = get_or_create_cart(request)
+    if isinstance(cart, GuestCart):
+        if request.method == 'POST':
+            cart.set_quantity(item_id, int(request.POST.get('quantity', 1)))
+        return redirect('cart_view')
     cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
     
     if request.method == 'POST':
@@ -158,54 +234,52 @@ def update_cart_quantity(request, item_id):
     return redirect('cart_view')
 
 
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import transaction
 from .forms import AddressForm, CheckoutForm
 from .models import Address, Order, OrderItem
+from .services import place_order, EmptyCartError, OutOfStockError
 
 @login_required
+@serialize_writes
 def checkout(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = CartItem.objects.filter(cart=cart)
+    summary = cart.summary()
     
-    if not cart_items:
+    if not summary:
         return redirect('cart_view')
     
-    total_price = sum(item.get_total_price() for item in cart_items)
+    cart_items = summary.items
+    total_price = summary.subtotal
     
     # Get user's saved addresses
     addresses = Address.objects.filter(user=request.user)
+    error = None
     
     if request.method == 'POST':
         address_form = AddressForm(request.POST)
         checkout_form = CheckoutForm(request.POST)
         
         if address_form.is_valid() and checkout_form.is_valid():
-            # Save address
-            address = address_form.save(commit=False)
-            address.user = request.user
-            address.save()
-            
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                total_price=total_price,
-                shipping_address=address,
-                payment_method=checkout_form.cleaned_data['payment_method'],
-                payment_status='pending'
-            )
-            
-            # Create order items
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price
-                )
-            
-            # Clear cart
-            cart_items.delete()
-            
-            return redirect('order_confirmation', order_id=order.id)
+            try:
+                with transaction.atomic():
+                    # Save address
+                    address = address_form.save(commit=False)
+                    address.user = request.user
+                    address.save()
+                    
+                    # Create order - stock, items and cart clearing in one transaction
+                    order = place_order(
+                        request.user, cart, address,
+                        payment_method=checkout_form.cleaned_data['payment_method'],
+                    )
+            except OutOfStockError as e:
+                error = str(e)
+            except EmptyCartError:
+                return redirect('cart_view')
+            else:
+                return redirect('order_confirmation', order_id=order.id)
     else:
         address_form = AddressForm()
         checkout_form = CheckoutForm()
@@ -215,10 +289,12 @@ def checkout(request):
         'total_price': total_price,
         'address_form': address_form,
         'checkout_form': checkout_form,
-        'addresses': addresses
+        'addresses': addresses,
+        'error': error
     })
 
 @login_required
+@private_cache
 def order_confirmation(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     order_items = OrderItem.objects.filter(order=order)
@@ -229,13 +305,19 @@ def order_confirmation(request, order_id):
     })
 
 @login_required
+@private_cache
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    orders = Order.objects.filter(user=request.user).order_by('-created_at', '-id')
+    paginator = Paginator(orders, getattr(settings, 'STORE_ORDERS_PER_PAGE', 10))
+    page = paginator.get_page(request.GET.get('page'))
     return render(request, 'checkout/order_history.html', {
-        'orders': orders
+        'orders': page,
+        'page': page
     })
 
 @login_required
+@private_cache
+@condition(etag_func=order_etag, last_modified_func=order_last_modified)
 def order_detail(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     order_items = OrderItem.objects.filter(order=order)
@@ -254,8 +336,10 @@ def update_order_status(request, order_id):
     if request.method == 'POST':
         new_status = request.POST.get('status')
         if new_status in dict(Order.ORDER_STATUS):
-            order.status = new_status
-            order.save()
+            # The rollups and the customer's notification commit with the status
+            with transaction.atomic():
+                order.status = new_status
+                order.save()
             return redirect('/admin/store/order/')
     
     return render(request, 'admin/order_status_update.html', {
@@ -265,6 +349,8 @@ def update_order_status(request, order_id):
 
 # User ke liye order status check karne ka view
 @login_required
+@private_cache
+@condition(etag_func=order_etag, last_modified_func=order_last_modified)
 def track_order(request, order_id):
     order = get_object_or_404(Order, id=order_id, user=request.user)
     order_items = OrderItem.objects.filter(order=order)